@@ -1,4 +1,5 @@
 DEFAULT_SPIDER_NAME = 'spider'
+PIPE_PREFIX = 'pipe_'
 
 
 class _Pipeline(object):
@@ -12,11 +13,53 @@ class _Pipeline(object):
             "results": {
                 "http://www.example.com/a": "aaa",
                 "http://www.example.com/b": "bbb"
+            },
+            "validators": {
+                "http://www.example.com/a": {
+                    "etag": "...",
+                    "last_modified": "...",
+                    "links": ["http://www.example.com/b"],
+                    "redirect": null
+                }
             }
         }
+    validators为页面的校验信息，用于再次爬取时发送条件请求
     """
 
     __spider__ = None
 
     def __init__(self):
         pass
+
+
+def resolve_pipes(pipeline, order=None, disabled=None):
+    """
+    解析数据管道对象中所有以pipe_开头的可执行方法
+    :param pipeline: 数据管道对象
+    :param order: 优先执行的方法名列表，按列表顺序执行，其余方法按名称排序在后
+    :param disabled: 不执行的方法名列表
+    方法名可以是"pipe_xxx"，也可以带上类名"Pipeline.pipe_xxx"
+    :return: [(带类名的方法名, 绑定方法), ...]
+    """
+    order = list(order or [])
+    disabled = set(disabled or [])
+    class_name = type(pipeline).__name__
+    pipes = []
+    for method in dir(pipeline):
+        if not method.startswith(PIPE_PREFIX):
+            continue
+        name = '.'.join([class_name, method])
+        if method in disabled or name in disabled:
+            continue
+        func = getattr(pipeline, method)
+        if callable(func):
+            pipes.append((name, method, func))
+
+    def sort_key(pipe):
+        name, method, _ = pipe
+        for idx, item in enumerate(order):
+            if item in (name, method):
+                return idx, name
+        return len(order), name
+
+    return [(name, func) for name, _, func in sorted(pipes, key=sort_key)]
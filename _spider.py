@@ -1,25 +1,47 @@
 import asyncio
 import base64
+import functools
 from datetime import datetime
-import fcntl
 import os
 import sys
 import time
 import traceback
 
-from fake_useragent import UserAgent
 from loguru import logger
 from multiprocessing import Queue
-from pyquery import PyQuery
 from urllib import parse
 
 import common as cm
 import config as conf
 import constansts as cons
 
-from ahocorasick import AcAutomaton
+from _pipeline import resolve_pipes
+from ahocorasick import get_automaton
+from cpu_pool import UselessPageDetector
+from cpu_pool import classify_and_extract
+from cpu_pool import get_cpu_executor
+from cpu_pool import is_useless_page
+from cpu_pool import run_cpu_task
+from dns_cache import prefetch_nowait
+from file_sink import get_file_sink
+from frontier import Frontier
+from journal import get_journal
+from link_extractor import extract_links
+from link_extractor import filter_links
+from politeness import get_host_scheduler
+from proxy_utils import ByteBudget
+from proxy_utils import FetchResult
 from proxy_utils import aio_request
 from proxy_utils import request_with_proxy
+from render_policy import RENDER_HYBRID
+from render_policy import get_render_decisions
+from render_policy import needs_render
+from resource_gate import GATE_STATS
+from seen_store import create_seen_store
+from splash_pool import get_splash_pool
+from ua_provider import get_user_agent_provider
+from url_redirect import REDIRECT_STATS
+from validator_store import create_validator_store
 
 queue = Queue()
 os.chdir(sys.path[0])
@@ -37,35 +59,7 @@ def get_domain_from_url(url, with_type=False, with_port=False):
     :param with_port: 是否保留端口
     :return: www.sangfor.com.cn
     """
-    try:
-        protocol, res = parse.splittype(url)
-        host, res = parse.splithost(res)
-        if not host:
-            host = res
-        domain, port = parse.splitport(host)
-        if with_type:
-            domain = ''.join([protocol, ':', domain])
-        if with_port:
-            domain = ''.join([domain, ':', port])
-        return domain
-    except Exception as err:
-        logger.warning('Get domain from url failed! Error: %s' % err)
-
-
-def is_not_special_type_link(link):
-    """
-    该链接是否指向特定后缀名的资源
-    :param link
-    :type link: str
-    """
-    if link.endswith('download/app'):
-        return True
-    link_extension = link.split('.')[-1]
-    not_in = link_extension not in cons.IGNORED_EXTENSIONS
-    if not not_in:
-        logger.info(
-            'Ignored url: {}, its type: {}'.format(link, link_extension))
-    return not_in
+    return cm.get_host_from_url(url, with_port=with_port, with_type=with_type)
 
 
 class _Spider(object):
@@ -77,6 +71,13 @@ class _Spider(object):
     __ignored_domains__ = []
     __ignored_pages__ = []
     __ignored_slds__ = []
+    # 已爬取url的去重存储方式（set/bloom），为空则使用配置项
+    __seen_store__ = None
+    # 数据管道方法的执行顺序与不执行的方法，方法名可为"pipe_xxx"或"类名.pipe_xxx"
+    __pipe_order__ = []
+    __disabled_pipes__ = []
+    # 页面内链接的解析方式（pyquery/fast），为空则使用配置项
+    __link_extractor__ = None
     before_request_middleware = []
     after_request_middleware = []
 
@@ -84,7 +85,7 @@ class _Spider(object):
                  max_depth=2, decode=True, display_path=False,
                  level=0, splash=False, proxy=False,
                  bs64encode_filename=False, user_agent=None,
-                 time_wait=None, timeout=5 * 60):
+                 time_wait=None, timeout=5 * 60, max_workers=None):
         self.site = site
         self.output_dir = output_dir
         self.semaphore = semaphore
@@ -100,22 +101,29 @@ class _Spider(object):
         self.user_agent = user_agent
         self.time_wait = time_wait
         self.timeout = timeout
+        # 每个站点同时处理url的工作协程数上限
+        self.max_workers = max_workers or conf.FRONTIER_WORKERS
         self.pipelines = []
+        # 预先解析的数据管道方法列表：[(方法名, 绑定方法), ...]
+        self.pipe_dispatch = []
+        # 各管道方法的执行统计：方法名 -> [执行次数, 总耗时(秒)]
+        self.pipe_stats = {}
 
         self.name = ''
-        self.count = 0
         self.download_count = 0
         self.success_count = 0
         self.useless_page_count = 0
-        self.result_dict = None
-        self.has_crawled_pages = []
-        self.init_result_cache()
-        self.record_path = os.path.join(
-            os.path.abspath(os.path.join(self.output_dir, '..')),
-            'record.txt'
-        )
+        self.has_crawled_pages = create_seen_store(self.__seen_store__)
+        # 该站点的下载字节数预算
+        self.byte_budget = ByteBudget()
+        self.frontier = None
+        # 页面校验信息存储，开启条件请求时在运行前创建
+        self.validators = None
+        self.journal = get_journal(
+            os.path.abspath(os.path.join(self.output_dir, '..')))
         try:
-            self.ac = AcAutomaton(cons.USELESS_PAGE_FEATURE)
+            # 同一进程中的所有爬虫共享同一个自动机
+            self.ac = get_automaton(cons.USELESS_PAGE_FEATURE, 'useless')
         except Exception:
             logger.error(
                 'Create AcAutomation failed! '
@@ -139,23 +147,44 @@ class _Spider(object):
         wrapper()
 
     def add_pipeline(self, obj):
+        """
+        添加数据管道，并解析出其中需要执行的管道方法
+        :param obj: 数据管道对象
+        :return: 管道中是否有可执行的管道方法
+        """
+        pipes = resolve_pipes(
+            obj, self.__pipe_order__, self.__disabled_pipes__)
+        if not pipes:
+            logger.info('No pipe method in pipeline: %s' % obj)
+            return False
         self.pipelines.append(obj)
+        for name, func in pipes:
+            self.pipe_dispatch.append((name, func))
+            self.pipe_stats.setdefault(name, [0, 0.0])
+        return True
 
-    def init_result_cache(self):
-        self.result_dict = {
+    def make_result(self):
+        """
+        创建单个页面的结果，每个页面使用各自的结果，避免并发的工作协程互相覆盖
+        :return:
+        """
+        return {
             'task': self.site,
-            'results': {}
+            'results': {},
+            'validators': {}
         }
 
     def filter(self, stream):
         return stream
 
-    def _save(self):
+    async def _save(self, result):
         """
-        保存页面到文件
+        保存页面到文件，由后台线程写入
+        :param result: 页面结果
         :return:
         """
-        for page, content in self.result_dict['results'].items():
+        sink = get_file_sink()
+        for page, content in result['results'].items():
             if not content:
                 continue
             if self.bs64encode_filename:
@@ -170,30 +199,38 @@ class _Spider(object):
                 # 对于超过限制的文件名，采用md5替代
                 filename = cm.get_md5(filename)
             output = os.path.join(self.output_dir, filename)
-            with open(output, 'w') as fw:
-                fcntl.flock(fw, fcntl.LOCK_EX)
-                fw.write(content)
-                fcntl.flock(fw, fcntl.LOCK_UN)
+            on_written = None
+            record = result['validators'].get(page)
+            if record is not None and self.validators is not None:
+                # 页面写入成功之后才保存校验信息
+                on_written = functools.partial(
+                    self.validators.set, page, record)
+            await sink.put(output, content, on_written)
         if self.display_path:
             logger.info('All results for url: {} are saved in path: '
                         '{}'.format(self.site, self.output_dir))
 
-    def pipe_process(self):
+    async def pipe_process(self, result):
         """
         处理数据管道
+        :param result: 页面结果
         :return:
         """
-        if not self.pipelines:
+        if not self.pipe_dispatch:
             # 没有传入管道，那么使用默认的存储方法
-            self._save()
+            await self._save(result)
         else:
-            # 遍历管道类中的所有以pipe_开头的方法，全部调用
-            for pipeline in self.pipelines:
-                for method in dir(pipeline):
-                    if method.startswith('pipe_'):
-                        func = getattr(pipeline, method)
-                        if callable(func):
-                            func(self.result_dict)
+            # 依次调用添加管道时解析出的所有管道方法
+            for name, func in self.pipe_dispatch:
+                start = time.time()
+                func(result)
+                stat = self.pipe_stats[name]
+                stat[0] += 1
+                stat[1] += time.time() - start
+            # 所有管道方法执行成功之后才保存校验信息
+            if self.validators is not None:
+                for page, record in result['validators'].items():
+                    self.validators.set(page, record)
 
     def extract_links(self, url, page_content, page_text):
         """
@@ -203,124 +240,74 @@ class _Spider(object):
         :param page_text: 解码之后的页面内容
         :return:
         """
-        if not page_content:
-            return set()
-        links = set()
-        logger.info('Extract links from page: %s' % url)
-        try:
-            dom_tree = PyQuery(page_content)
-        except Exception as err:
-            logger.warning(
-                'Parse dom tree failed! The error: %s' % err)
-            return links
-        if dom_tree is None:
-            logger.info('Get no dom tree for url: %s' % url)
-            return links
-
-        for ele in dom_tree('a'):
-            if not 'href' in ele.attrib:
-                continue
-            href = ele.attrib['href']
-            if href in ['/', '*']:
-                continue
-            if href.startswith('javascript') or href.startswith('mailto'):
-                continue
-            links.add(href)
-            logger.info('Get link: %s' % href)
-
-        for iframe in dom_tree('frame,iframe'):
-            if not 'src' in iframe.attrib:
-                continue
-            iframe_src = iframe.attrib['src']
-            if iframe_src is None or iframe_src.strip() in [
-                "", "about:blank", "*"]:
-                continue
-            if "*" in iframe_src:
-                continue
-            # real_iframe_src = get_real_src(url, iframe_src)
-            links.add(iframe_src)
-            logger.info('Get link: %s' % iframe_src)
-        # 使用正则匹配可能未解析到的url
-        extra_urls = cm.match_url(page_text)
-        for extra_url in extra_urls:
-            links.add(extra_url)
-        # 去掉不需要的后缀的链接
-        links = filter(is_not_special_type_link, links)
-
-        if self.level == 0:
-            current_domain = cm.get_host_from_url(url)
-            filter_func = lambda x: cm.get_host_from_url(x) == current_domain
-        elif self.level == 1:
-            current_sld = cm.get_sld(url)
-            filter_func = lambda x: cm.get_sld(x) == current_sld
-        elif self.level == 2:
-            filter_func = lambda x: 1
-        else:
-            raise ValueError('The column "level" must in (0, 1, 2),'
-                             ' but now is: {}'.format(self.level))
-        links = {cm.validate_and_fill_url(url, link) for link in links}
-        links = filter(filter_func, links)
+        links = extract_links(
+            url, page_content, page_text, self.level,
+            self.__link_extractor__ or conf.LINK_EXTRACTOR)
         if not links:
             logger.info('No links in page: %s' % url)
+        elif self.level:
+            # 可能跨域名爬取时，提前在后台解析新发现的host
+            prefetch_nowait(cm.get_host_from_url(link) for link in links)
         return links
 
-    async def download_page(self, url):
+    async def process_page(self, url, page_content, page_text, extract=True):
+        """
+        判断页面是否无用并解析页面内链接
+        开启CPU_OFFLOAD时在进程池中执行，此时不会调用子类重写的extract_links
+        :param url: 页面url
+        :param page_content: 页面内容
+        :param page_text: 解码之后的页面内容
+        :param extract: 是否解析页面内链接
+        :return: (是否为无用页面, 页面内链接)
+        """
+        if get_cpu_executor() is None:
+            if is_useless_page(page_text, self.ac):
+                return True, None
+            if not extract:
+                return False, None
+            return False, self.extract_links(url, page_content, page_text)
+        useless, links = await run_cpu_task(
+            classify_and_extract, url, page_content, page_text, self.level,
+            self.__link_extractor__ or conf.LINK_EXTRACTOR, extract)
+        if links and self.level:
+            prefetch_nowait(cm.get_host_from_url(link) for link in links)
+        return useless, links
+
+    async def download_page(self, url, depth=1):
         """
         下载单个页面
         :param url: 待下载url
-        :return:
+        :param depth: 该url所处深度
+        :return: FetchResult
         """
-        standard_url = cm.standard_url(url)
-        if standard_url in self.has_crawled_pages:
-            logger.info('The url has been crawled, '
-                        'now skip it: {}'.format(url))
-            return '', ''
-        self.has_crawled_pages.append(standard_url)
+        if self.byte_budget.exhausted:
+            logger.info('The byte budget of the site is exhausted, '
+                        'now skip the url: {}'.format(url))
+            return FetchResult(truncated=True)
         self.download_count += 1
-        if self.splash:
-            # 请求splash服务器
-            rq_url = conf.SPLASH_RENDER
-            rq_params = {
-                'url': url,
-                'image': conf.ENABLE_IMAGE,
-                'timeout': conf.SPLASH_TIMEOUT
-            }
-            headers = {}
-        else:
-            rq_url = url
-            rq_params = {}
-            url_obj = parse.urlparse(rq_url)
-            if self.count == 1:
-                referer = cons.DEFAULT_REFERER
-            else:
-                referer = url_obj.scheme + url_obj.netloc
-            if not self.user_agent:
-                ua = UserAgent(use_cache_server=False, path=conf.FAKE_UA_DATA_PATH)
-                user_agent = ua.random
-            else:
-                user_agent = self.user_agent
-
-            headers = {
-                'Referer': referer,
-                'User-Agent': user_agent
-            }
+        host = cm.get_host_from_url(url)
+        if self.time_wait:
+            # 如果指定了等待时间，那么同一host的请求之间至少间隔该时间来降低爬虫速度，
+            # 只对去重之后真正需要下载的url等待
+            await get_host_scheduler().wait(host, self.time_wait)
+        decisions = get_render_decisions()
         try:
-            if self.proxy:
-                content, page_text = await request_with_proxy(
-                    method='GET',
-                    url=rq_url,
-                    params=rq_params,
-                    headers=headers,
-                    timeout=self.timeout
-                )
+            if self.splash and (conf.SPLASH_MODE != RENDER_HYBRID or
+                                decisions.prefer_render(host)):
+                result = await self.render_page(url)
             else:
-                content, page_text = await aio_request(
-                    method='GET',
-                    url=rq_url,
-                    params=rq_params,
-                    headers=headers,
-                    timeout=self.timeout
-                )
+                # 读取响应内容时提前判定无用页面
+                detector = UselessPageDetector() \
+                    if conf.USELESS_STREAM_DETECT else None
+                # 爬虫的并发数只限制直接下载，渲染由splash执行器单独限制
+                async with self.semaphore:
+                    result = await self.fetch_page(url, depth, detector)
+                if self.splash and not result.not_modified:
+                    reason = needs_render(
+                        result, detector.feature if detector else None)
+                    decisions.record(host, reason)
+                    if reason is not None:
+                        result = await self.render_or_static(url, result)
         except Exception:
             logger.warning(
                 'Download page content failed, '
@@ -330,102 +317,245 @@ class _Spider(object):
             raise
         logger.info('Download successfully, url: {}'.format(url))
         self.success_count += 1
-        return content, page_text
+        return result
+
+    async def _request(self, url, params, headers, parse_redirect_url,
+                       on_chunk):
+        """按照是否使用代理发送请求"""
+        if self.proxy:
+            return await request_with_proxy(
+                method='GET',
+                url=url,
+                params=params,
+                headers=headers,
+                parse_redirect_url=parse_redirect_url,
+                timeout=self.timeout,
+                budget=self.byte_budget,
+                on_chunk=on_chunk
+            )
+        return await aio_request(
+            method='GET',
+            url=url,
+            params=params,
+            headers=headers,
+            parse_redirect_url=parse_redirect_url,
+            timeout=self.timeout,
+            budget=self.byte_budget,
+            on_chunk=on_chunk
+        )
 
-    async def crawl_in_one_loop(self, tmp_links, url, last_one=False):
+    async def fetch_page(self, url, depth=1, on_chunk=None):
         """
-        单个url爬虫
-        :param tmp_links:
-        :param url:
-        :param last_one: 是否为最后一个层级
+        直接下载页面
+        :param url: 待下载url
+        :param depth: 该url所处深度
+        :param on_chunk: 分块读取时的回调
+        :return: FetchResult
+        """
+        url_obj = parse.urlparse(url)
+        if depth == 1:
+            referer = cons.DEFAULT_REFERER
+        else:
+            referer = url_obj.scheme + url_obj.netloc
+        if not self.user_agent:
+            user_agent = get_user_agent_provider().get(url_obj.netloc)
+        else:
+            user_agent = self.user_agent
+
+        headers = {
+            'Referer': referer,
+            'User-Agent': user_agent
+        }
+        if self.validators is not None:
+            headers.update(self.validators.conditional_headers(url))
+        return await self._request(url, {}, headers, True, on_chunk)
+
+    async def render_page(self, url):
+        """
+        交由splash渲染执行器渲染页面，splash会执行页面中的跳转，因此不再解析跳转
+        :param url: 待渲染url
+        :return: FetchResult
+        """
+        on_chunk = UselessPageDetector() if conf.USELESS_STREAM_DETECT else None
+        result = await get_splash_pool().render(
+            url, budget=self.byte_budget, on_chunk=on_chunk)
+        # splash的响应头不是页面本身的响应头，渲染的页面不保存校验信息
+        result.headers = None
+        return result
+
+    async def render_or_static(self, url, static_result):
+        """
+        渲染已直接下载的页面，渲染失败时沿用直接下载的结果，保证链接的覆盖
+        :param url: 待渲染url
+        :param static_result: 直接下载的结果
+        :return: FetchResult
+        """
+        try:
+            return await self.render_page(url)
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            logger.warning('Render page failed, now use the static page '
+                           'instead, url: {}, error: {!r}'.format(url, err))
+            return static_result
+
+    def put_redirect(self, url, target, depth):
+        """
+        跳转目标与当前页面处于同一深度，按照爬取级别过滤之后正常去重与下载
+        :param url: 跳转前的url
+        :param target: 跳转目标url
+        :param depth: 跳转前的url所处深度
         :return:
         """
-        async with self.semaphore:
-            if self.__ignored_slds__:
-                if cm.get_sld(url) in self.__ignored_slds__:
-                    return
-            if self.__ignored_domains__:
-                if cm.get_host_from_url(url) in self.__ignored_domains__:
-                    return
-            if self.__ignored_pages__:
-                if url in self.__ignored_pages__:
-                    return
-            try:
-                content, page_text = await self.download_page(url)
-            except Exception:
-                # 记录错误信息
-                logger.info('Cache failed info...')
-                with open(self.record_path, 'a') as fa:
-                    fcntl.flock(fa, fcntl.LOCK_EX)
-                    fa.write('Failed: %s\n' % url)
-                    fcntl.flock(fa, fcntl.LOCK_UN)
-                    return
-            # 记录成功的url
-            with open(self.record_path, 'a') as fa:
-                fcntl.flock(fa, fcntl.LOCK_EX)
-                fa.write('Success: %s\n' % url)
-                fcntl.flock(fa, fcntl.LOCK_UN)
+        for link in filter_links(url, {target}, self.level):
+            self.frontier.put(link, depth)
 
-            if not content:
-                logger.info('Ignore blank page! The url: %s' % url)
-                self.useless_page_count += 1
+    async def crawl_in_one_loop(self, url, depth):
+        """
+        单个url爬虫
+        :param url:
+        :param depth: 该url所处深度，超过最大深度的页面不再解析页面内链接
+        :return: 需要继续爬取的页面内链接
+        """
+        parsed = cm.parse_url(url)
+        if parsed is None:
+            return
+        min_depth = self.has_crawled_pages.min_depth(cm.standard_url(url))
+        if min_depth is not None and min_depth < depth:
+            # 该url已以更浅的深度重新入队，按照更浅的深度爬取
+            return
+        if self.__ignored_slds__:
+            if parsed.sld in self.__ignored_slds__:
+                return
+        if self.__ignored_domains__:
+            if parsed.host in self.__ignored_domains__:
                 return
-            if self.ac.search(page_text) and len(page_text) < 1000:
-                logger.info('Ignore useless page! The url: %s' % url)
-                self.useless_page_count += 1
+        if self.__ignored_pages__:
+            if url in self.__ignored_pages__:
+                return
+        start = time.time()
+        try:
+            result = await self.download_page(url, depth)
+        except Exception:
+            # 记录错误信息
+            logger.info('Cache failed info...')
+            self.journal.record(
+                'Failed', url, depth, latency=time.time() - start)
+            return
+        if result.not_modified:
+            # 页面未修改，不再处理数据管道，沿用上次解析的链接继续遍历
+            self.journal.record(
+                'NotModified', url, depth, latency=time.time() - start)
+            record = None
+            if self.validators is not None:
+                record = self.validators.cached_record(url)
+            if record is None:
+                logger.info('No cached links for the unmodified page: '
+                            '{}'.format(url))
                 return
-            if self.decode:
-                self.result_dict['results'][url] = self.filter(page_text)
+            if record['redirect']:
+                self.put_redirect(url, record['redirect'], depth)
+            if depth > self.max_depth:
+                return
+            return record['links']
+        content, page_text = result
+        if result.truncated and not content:
+            # 站点的字节数预算已用完，没有读取任何内容
+            self.journal.record(
+                'Skipped', url, depth, latency=time.time() - start)
+            return
+        # 记录成功的url，只读取了部分内容的记为Truncated
+        self.journal.record(
+            'Truncated' if result.truncated else 'Success', url, depth,
+            len(content), time.time() - start)
+
+        if result.redirect_url:
+            self.put_redirect(url, result.redirect_url, depth)
+        if result.aborted:
+            logger.info('Ignore aborted page! The url: %s' % url)
+            self.useless_page_count += 1
+            return
+        if not content:
+            logger.info('Ignore blank page! The url: %s' % url)
+            self.useless_page_count += 1
+            return
+        # 超过最大深度的页面不去解析页面内链接
+        useless, links = await self.process_page(
+            url, content, page_text, depth <= self.max_depth)
+        if useless:
+            logger.info('Ignore useless page! The url: %s' % url)
+            self.useless_page_count += 1
+            return
+        page_result = self.make_result()
+        if self.decode:
+            page_result['results'][url] = self.filter(page_text)
+        else:
+            page_result['results'][url] = self.filter(content)
+        if self.validators is not None and not result.truncated:
+            record = self.validators.make_record(
+                result.headers, links, result.redirect_url)
+            if record is not None:
+                page_result['validators'][url] = record
             else:
-                self.result_dict['results'][url] = self.filter(content)
-            if not last_one:
-                # 最后一个层级不去解析页面内链接
-                links = self.extract_links(url, content, page_text)
-                if links:
-                    for link in links:
-                        tmp_links.add(link)
-
-            # 处理数据管道
-            self.pipe_process()
-            # 保存完毕之后清空缓存结果，减少内存开销
-            self.init_result_cache()
-            # 如果指定了等待时间，那么等待一段时间来降低爬虫速度
-            if self.time_wait:
-                time.sleep(self.time_wait)
+                self.validators.discard(url)
+
+        # 处理数据管道
+        await self.pipe_process(page_result)
+        return links
+
+    def admit_url(self, url, depth):
+        """
+        链接入队前去重，已入队过的url只在以更浅的深度出现时重新入队
+        :param url: 待爬取url
+        :param depth: 该url所处深度
+        :return: 是否需要爬取
+        """
+        if not self.has_crawled_pages.add(cm.standard_url(url), depth):
+            logger.debug('The url has been crawled, '
+                         'now skip it: {}'.format(url))
+            return False
+        return True
 
     async def crawl(self, urls):
         """
         爬取一个站点下的多个链接页面
-        :param urls: url列表
+        :param urls: 种子url列表
         :return:
         """
-        # 已爬取深度计数加1
-        self.count += 1
-        # 用于递归传递url
-        tmp_links = set()
-        tasks = []
-        last_one = False
-        if self.count > self.max_depth:
-            last_one = True
-        for url in urls:
-            tasks.append(self.crawl_in_one_loop(tmp_links, url, last_one))
-        await asyncio.gather(*tasks)
-
-        if tmp_links:
-            await self.crawl(tmp_links)
+        self.frontier = Frontier(
+            self.crawl_in_one_loop, self.max_workers, self.admit_url)
+        await self.frontier.run(urls)
 
     async def run(self):
         """运行"""
         start = time.time()
+        if conf.CONDITIONAL_RECRAWL:
+            self.validators = create_validator_store(
+                self.output_dir, self.site, self.pipelines)
         await self.crawl([self.site])
+        # 等待页面写入完成，写入成功的页面的校验信息才会被保存
+        await get_file_sink().drain()
+        if self.validators is not None:
+            self.validators.save()
+        self.journal.flush()
+        validator_stats = self.validators.stats() \
+            if self.validators is not None else None
         end = time.time()
         expense = end - start
         speed = self.download_count / expense
         logger.info(
             'Crawl finished! The task: {}, '
             'all pages found: {}, successfully download: {},'
-            ' expense time: {}s, speed: {}/s'.format(
+            ' expense time: {}s, speed: {}/s, seen store: {},'
+            ' file sink: {}, pipes: {}, text url scan: {},'
+            ' url cache: {}, resource gate: {}, redirects: {},'
+            ' render decisions: {}, splash pool: {}, validators: {}'.format(
                 self.site, self.download_count,
-                self.success_count, expense, speed)
+                self.success_count, expense, speed,
+                self.has_crawled_pages.stats(), get_file_sink().stats(),
+                self.pipe_stats, cm.URL_SCAN_STATS, cm.url_cache_stats(),
+                GATE_STATS, REDIRECT_STATS, get_render_decisions().stats(),
+                get_splash_pool().stats(),
+                validator_stats)
         )
         queue.put((self.download_count, self.success_count, self.useless_page_count))
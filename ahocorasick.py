@@ -2,99 +2,305 @@
 Ac自动机
 """
 
+import hashlib
+import json
+import mmap
 import os
-import pickle
-import codecs
+import re
+import struct
+import sys
 
+from array import array
+from collections import deque
 
-class TrieNode:
-    def __init__(self):
-        self.success = dict()  # 转移表
-        self.failure = None  # 错误表
-        self.emits = set()  # 输出表
+from loguru import logger
+
+import config as conf
+
+# 持久化文件格式：魔数、元数据长度、JSON元数据、按4字节对齐的uint32转移表
+MODEL_MAGIC = b'ACA1'
+_HEADER = struct.Struct('<4sI')
+
+
+def pattern_digest(patterns):
+    """
+    计算模式串列表的内容摘要，模式串变化后摘要随之变化
+    :param patterns: 模式串列表（str或bytes）
+    :return:
+    """
+    digest = hashlib.sha1()
+    for pattern in patterns:
+        if isinstance(pattern, str):
+            digest.update(b's' + pattern.encode('utf-8'))
+        else:
+            digest.update(b'b' + bytes(pattern))
+        digest.update(b'\0')
+    return digest.hexdigest()
 
 
 class AcAutomaton(object):
+    """
+    表驱动的AC自动机，构建时即把失败跳转合并进转移表，匹配时每个字符只需查一次表
+    转移表为一维数组，第state行第col列的值为下一状态所在行的起始下标(状态号*列数)，
+    第0列对应不在任何模式串中出现的字符
+    """
 
     def __init__(self, patterns, model_path=None):
         """
         :param patterns: 模式串列表
-        :param model_path: AC自动机持久化位置
+        :param model_path: AC自动机持久化位置，文件中的摘要与模式串一致时直接映射加载
         """
         self._save_path = model_path
         self._patterns = patterns
+        self.digest = pattern_digest(patterns)
+        # 映射加载时持有的mmap对象
+        self._mmap = None
+        # 字符 -> 转移表中的列号
+        self._columns = {}
+        self._width = 1
+        self._table = array('I', [0])
+        # 有输出的状态(行起始下标) -> 该状态匹配到的模式串
+        self._emits = {}
         if self._save_path and os.path.exists(self._save_path):
-            self._root = self.__load_corasick()
-            if not self._root:
+            if not self.__load_corasick():
                 self.refresh()
         else:
             self.refresh()
 
-    def __insert_node(self):
+    @property
+    def state_count(self):
+        """状态数"""
+        return len(self._table) // self._width
+
+    def __build_trie(self):
         """
         Create Trie
         """
+        goto = [{}]
+        emits = [()]
         for pattern in self._patterns:
-            line = self._root
+            if not pattern:
+                continue
+            state = 0
             for character in pattern:
-                line = line.success.setdefault(character, TrieNode())
-            line.emits.add(pattern)
+                next_state = goto[state].get(character)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][character] = next_state
+                    goto.append({})
+                    emits.append(())
+                state = next_state
+            if pattern not in emits[state]:
+                emits[state] += (pattern,)
+        return goto, emits
 
-    def __create_fail_path(self):
+    def __build_table(self, goto, emits):
         """
-        Create Fail Path
+        按广度优先顺序计算失败跳转，并合并进转移表
         """
-        my_queue = list()
-        for node in self._root.success.values():
-            node.failure = self._root
-            my_queue.append(node)
-        while len(my_queue) > 0:
-            gone_node = my_queue.pop(0)
-            for k, v in gone_node.success.items():
-                my_queue.append(v)
-                parent_failure = gone_node.failure
-
-                while parent_failure and k not in parent_failure.success.keys():
-                    parent_failure = parent_failure.failure
-                v.failure = parent_failure.success[k] if parent_failure else self._root
-                if v.failure.emits:
-                    v.emits = v.emits.union(v.failure.emits)
+        alphabet = sorted({char for edges in goto for char in edges})
+        columns = {char: col for col, char in enumerate(alphabet, 1)}
+        width = len(alphabet) + 1
+        table = array('I', [0]) * (len(goto) * width)
+        failure = [0] * len(goto)
+        queue = deque([0])
+        while queue:
+            state = queue.popleft()
+            row = state * width
+            fail_row = failure[state] * width
+            for char, col in columns.items():
+                next_state = goto[state].get(char)
+                if next_state is not None:
+                    table[row + col] = next_state * width
+                elif state:
+                    table[row + col] = table[fail_row + col]
+            for char, next_state in goto[state].items():
+                if state:
+                    failure[next_state] = \
+                        table[fail_row + columns[char]] // width
+                inherited = emits[failure[next_state]]
+                if inherited:
+                    emits[next_state] += tuple(
+                        p for p in inherited if p not in emits[next_state])
+                queue.append(next_state)
+        self._columns = columns
+        self._width = width
+        self._table = table
+        self._emits = {state * width: emit
+                       for state, emit in enumerate(emits) if emit}
 
     def __save_corasick(self):
-        with codecs.open(self._save_path, "wb") as f:
-            pickle.dump(self._root, f)
+        is_bytes = bool(self._patterns) and isinstance(self._patterns[0], bytes)
+        patterns = [p.hex() if is_bytes else p for p in self._patterns]
+        index = {p: i for i, p in enumerate(self._patterns)}
+        meta = json.dumps({
+            'digest': self.digest,
+            'bytes': is_bytes,
+            'byteorder': sys.byteorder,
+            'width': self._width,
+            'alphabet': sorted(self._columns, key=self._columns.get),
+            'patterns': patterns,
+            'emits': [[state, [index[p] for p in emit]]
+                      for state, emit in self._emits.items()],
+        }, ensure_ascii=False).encode('utf-8')
+        padding = b'\0' * (-(_HEADER.size + len(meta)) % 4)
+        tmp_path = '{}.{}.tmp'.format(self._save_path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(MODEL_MAGIC, len(meta)))
+            f.write(meta)
+            f.write(padding)
+            f.write(self._table.tobytes())
+        # 多个进程同时写入时，后写入的完整文件覆盖先写入的
+        os.replace(tmp_path, self._save_path)
 
     def __load_corasick(self):
-        with codecs.open(self._save_path, "rb") as f:
-            try:
-                return pickle.load(f)
-            except (EOFError, TypeError):
-                return None
+        try:
+            with open(self._save_path, 'rb') as f:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+        try:
+            magic, meta_len = _HEADER.unpack_from(buf)
+            if magic != MODEL_MAGIC:
+                raise ValueError('bad magic: {}'.format(magic))
+            start = _HEADER.size + meta_len
+            meta = json.loads(buf[_HEADER.size:start].decode('utf-8'))
+            if (meta['digest'] != self.digest or
+                    meta['byteorder'] != sys.byteorder):
+                raise ValueError('model is out of date')
+            start += -start % 4
+            table = memoryview(buf)[start:].cast('I')
+        except (struct.error, ValueError, KeyError, TypeError) as err:
+            buf.close()
+            logger.info('Ignore automaton model "{}": {}'.format(
+                self._save_path, err))
+            return False
+        patterns = meta['patterns']
+        if meta['bytes']:
+            patterns = [bytes.fromhex(p) for p in patterns]
+        self._columns = {
+            char: col for col, char in enumerate(meta['alphabet'], 1)}
+        self._width = meta['width']
+        self._table = table
+        self._emits = {state: tuple(patterns[i] for i in emit)
+                       for state, emit in meta['emits']}
+        self._mmap = buf
+        return True
 
     def refresh(self):
-        self._root = TrieNode()
-        self.__insert_node()
-        self.__create_fail_path()
+        goto, emits = self.__build_trie()
+        self.__build_table(goto, emits)
         if self._save_path:
             self.__save_corasick()
 
     def search(self, context):
+        """
+        查找文本中出现的所有模式串，同一模式串每出现一次返回一次
+        :param context: 待匹配文本
+        :return:
+        """
         search_result = list()
-        search_node = self._root
+        table, emits = self._table, self._emits
+        get_column = self._columns.get
+        state = 0
         for char in context:
-            while search_node and char not in search_node.success.keys():
-                search_node = search_node.failure
-            if not search_node:
-                search_node = self._root
-                continue
-            search_node = search_node.success[char]
-            if search_node.emits:
-                search_result += search_node.emits
+            state = table[state + get_column(char, 0)]
+            if state in emits:
+                search_result += emits[state]
         return search_result
 
+    def search_first(self, context):
+        """
+        查找文本中最先出现的模式串，找到即返回
+        :param context: 待匹配文本
+        :return: 模式串，未找到时返回None
+        """
+        return self.advance(context)[1]
+
+    def advance(self, context, state=0):
+        """
+        从指定状态开始匹配，找到模式串即停止，用于分段输入的流式匹配
+        模式串为bytes时，自动机同样可以直接匹配bytes
+        :param context: 待匹配的一段文本
+        :param state: 上一段文本匹配结束时的状态
+        :return: (匹配结束时的状态, 最先出现的模式串或None)
+        """
+        table, emits = self._table, self._emits
+        get_column = self._columns.get
+        for char in context:
+            state = table[state + get_column(char, 0)]
+            if state in emits:
+                return state, emits[state][0]
+        return state, None
+
+    def contains(self, context):
+        """
+        文本中是否出现任一模式串
+        :param context: 待匹配文本
+        :return:
+        """
+        return self.search_first(context) is not None
+
+    def count(self, context):
+        """
+        统计文本中模式串出现的总次数
+        :param context: 待匹配文本
+        :return:
+        """
+        total = 0
+        table, emits = self._table, self._emits
+        get_column = self._columns.get
+        state = 0
+        for char in context:
+            state = table[state + get_column(char, 0)]
+            if state in emits:
+                total += len(emits[state])
+        return total
+
+
+# 模式串摘要 -> 当前进程中已构建的自动机
+_registry = {}
+
+
+def get_automaton(patterns, name=None):
+    """
+    获取进程内共享的自动机，同一组模式串只构建一次
+    指定name时持久化到数据目录下的ac_<name>_<摘要>.bin，模式串变化后重新构建并删除旧文件
+    :param patterns: 模式串列表
+    :param name: 持久化文件名中的名称，为空则不持久化
+    :return:
+    """
+    digest = pattern_digest(patterns)
+    automaton = _registry.get(digest)
+    if automaton is not None:
+        return automaton
+    model_path = None
+    if name:
+        filename = 'ac_{}_{}.bin'.format(name, digest[:16])
+        # 同名但摘要不同的旧文件
+        pattern = re.compile(r'^ac_{}_[0-9a-f]{{16}}\.bin$'.format(re.escape(name)))
+        model_path = os.path.join(conf.DATA_DIR, filename)
+        try:
+            stale = [f for f in os.listdir(conf.DATA_DIR)
+                     if f != filename and pattern.match(f)]
+        except OSError:
+            stale = []
+        for f in stale:
+            try:
+                os.remove(os.path.join(conf.DATA_DIR, f))
+            except OSError:
+                pass
+    try:
+        automaton = AcAutomaton(patterns, model_path)
+    except OSError as err:
+        logger.warning('Save automaton model failed, error: {}'.format(err))
+        automaton = AcAutomaton(patterns)
+    _registry[digest] = automaton
+    return automaton
+
 
 if __name__ == "__main__":
     data = ['he', 'she', 'his', 'hers']
     s = "ushers"
-    ac = AcAutomaton(data, "model.pkl")
-    print(ac.search(s))
\ No newline at end of file
+    ac = AcAutomaton(data, "model.bin")
+    print(ac.search(s))
@@ -20,9 +20,16 @@ from queue import Empty
 import common as cm
 import config as conf
 
+from cpu_pool import close_cpu_executor
 from daemon import Daemon
+from dns_cache import prefetch
+from file_sink import close_file_sink
 from entrance import load_pipelines
 from entrance import load_spiders
+from http_session import close_session
+from journal import close_journals
+from proxy_manager import close_proxy_manager
+from splash_pool import close_splash_pool
 from _spider import DEFAULT_SPIDER_NAME
 
 message_queue = Queue()
@@ -143,10 +150,10 @@ def parse_args():
     )
     parser.add_option(
         '--time_wait',
-        type='int',
+        type='float',
         dest='time_wait',
-        help='Time wait between page download. '
-             'Used to slow down the crawler speed'
+        help='Minimum interval in seconds between requests '
+             'to the same host. Used to slow down the crawler speed'
     )
     name_help_str = 'Specifies the name of the crawler used to crawl the page'
     parser.add_option(
@@ -180,8 +187,7 @@ async def crawl_one_site(semaphore, base_output_dir,
         print(url)
         domain = cm.get_host_from_url(url)
         output_dir = os.path.join(base_output_dir, domain)
-        if not os.path.isdir(output_dir):
-            os.system('mkdir -p %s' % output_dir)
+        os.makedirs(output_dir, exist_ok=True)
         if not spider:
             spider = DEFAULT_SPIDER_NAME
         spiders = load_spiders()
@@ -209,12 +215,8 @@ async def crawl_one_site(semaphore, base_output_dir,
         pipelines = load_pipelines()
         for PClass in pipelines:
             if PClass.__spider__ == spider:
-                pipeline = PClass()
-                for method in dir(pipeline):
-                    if method.startswith('pipe_'):
-                        # 拥有可执行管道方法则添加管道
-                        spider_obj.add_pipeline(pipeline)
-                        break
+                # 拥有可执行管道方法则添加管道
+                spider_obj.add_pipeline(PClass())
         try:
             await spider_obj.run()
         except:
@@ -227,7 +229,10 @@ async def run_concurrent(semaphore, base_output_dir,
                          splash=False, proxy=False,
                          bs64encode_filename=False,
                          user_agent=None, timeout=5 * 60,
-                         time_wait=None, spider=None):
+                         time_wait=None, spider=None,
+                         prefetch_hosts=None):
+    # 在后台预先解析种子站点的host
+    prefetch_task = asyncio.ensure_future(prefetch(prefetch_hosts or []))
     tasks = []
     for idx in range(1024):
         tasks.append(
@@ -238,6 +243,7 @@ async def run_concurrent(semaphore, base_output_dir,
             )
         )
     await asyncio.gather(*tasks)
+    prefetch_task.cancel()
 
 
 def entrance(concurrent, base_output_dir,
@@ -245,16 +251,24 @@ def entrance(concurrent, base_output_dir,
              splash=False, proxy=False,
              bs64encode_filename=False,
              user_agent=None, timeout=5 * 60,
-             time_wait=None, spider=None):
+             time_wait=None, spider=None,
+             prefetch_hosts=None):
     event_loop = asyncio.get_event_loop()
     semaphore = asyncio.Semaphore(concurrent)
     event_loop.run_until_complete(
         run_concurrent(
             semaphore, base_output_dir, max_depth, level,
             splash, proxy, bs64encode_filename,
-            user_agent, timeout, time_wait, spider
+            user_agent, timeout, time_wait, spider,
+            prefetch_hosts
         )
     )
+    event_loop.run_until_complete(close_proxy_manager())
+    event_loop.run_until_complete(close_splash_pool())
+    event_loop.run_until_complete(close_session())
+    event_loop.run_until_complete(close_file_sink())
+    close_cpu_executor()
+    close_journals()
 
 
 class Worker(Daemon):
@@ -305,18 +319,22 @@ class Worker(Daemon):
             urls_queue.put(url)
         if not self.processes:
             self.processes = DEFAULT_PROCESSES
-        pool = Pool(self.processes)
-        for idx in range(self.processes):
-            pool.apply_async(
-                entrance,
-                args=(self.concurrent_limit,
-                      self.base_output_dir,
-                      self.max_depth, self.level,
-                      self.splash, self.proxy,
-                      self.bs64encode_filename,
-                      self.user_agent, self.timeout,
-                      self.time_wait, self.spider)
-            )
+        prefetch_hosts = list(
+            {cm.get_host_from_url(url) for url in self.urls} - {None})
+        args = (self.concurrent_limit, self.base_output_dir,
+                self.max_depth, self.level, self.splash, self.proxy,
+                self.bs64encode_filename, self.user_agent, self.timeout,
+                self.time_wait, self.spider, prefetch_hosts)
+        if conf.CPU_OFFLOAD:
+            # CPU密集的处理由进程池完成，只需一个负责网络IO的进程
+            # （Pool中的守护进程无法再创建子进程）
+            entrance(*args)
+        else:
+            pool = Pool(self.processes)
+            for idx in range(self.processes):
+                pool.apply_async(entrance, args=args)
+            pool.close()
+            pool.join()
         # for url in self.urls:
         #     pool.apply_async(
         #         crawl_one_site,
@@ -325,8 +343,6 @@ class Worker(Daemon):
         #               self.splash, self.proxy, self.bs64encode_filename,
         #               self.user_agent, self.timeout, self.time_wait, self.spider)
         #     )
-        pool.close()
-        pool.join()
 
         total_count = 0
         success_count = 0
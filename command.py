@@ -80,9 +80,9 @@ def kill():
 @click.option('--splash', '-S', type=bool, help=SPLASH_HELP_STR)
 @click.option('--proxy', '-P', type=bool, help=PROXY_HELP_STR)
 @click.option('--timeout', '-T', type=int, help='Request timeout')
-@click.option('--time_wait', type=int,
-              help='Time wait between page download. '
-                   'Used to slow down the crawler speed')
+@click.option('--time_wait', type=float,
+              help='Minimum interval in seconds between requests '
+                   'to the same host. Used to slow down the crawler speed')
 def submit(source, url, name, concurrent_limit, depth,
            user_agent, level, splash, proxy, timeout, time_wait):
     """submit one or more tasks"""
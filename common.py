@@ -1,14 +1,20 @@
 """
 公用函数
 """
+import asyncio
 import chardet
+import codecs
+import functools
 import hashlib
 import re
+import time
 
 from loguru import logger
 from urllib import parse
 
+import config as conf
 import constansts as cons
+import public_suffix
 
 
 def get_md5(content):
@@ -24,29 +30,131 @@ def get_md5(content):
     return md5.hexdigest()
 
 
-def url_parsing_init(url):
+# 只有后面紧跟//的才视为协议，避免把host:port中的host当成协议
+SCHEME_PATTERN = re.compile(r'^([a-zA-Z][a-zA-Z0-9+.\-]*):(?=//)')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+class ParsedUrl(object):
     """
-    url解析初始化
+    解析后的url，由parse_url缓存并在各处共享，因此不应修改其属性
+    """
+    __slots__ = ('url', 'scheme', 'host', 'port', 'netloc', 'path',
+                 'query', 'fragment', '_sld')
+
+    def __init__(self, url, scheme, host, port, netloc, path, query, fragment):
+        """
+        :param url: 原始url
+        :param scheme: 协议，未指定时为http
+        :param host: 小写的host，不含端口
+        :param port: 端口，未指定时为协议的默认端口
+        :param netloc: host加上url中显式指定的端口
+        :param path: 路径
+        :param query: 查询参数
+        :param fragment: 锚点
+        """
+        self.url = url
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.netloc = netloc
+        self.path = path
+        self.query = query
+        self.fragment = fragment
+        self._sld = None
+
+    @property
+    def origin(self):
+        """协议加上host与显式指定的端口，如http://www.test.com:8080"""
+        return ''.join([self.scheme, '://', self.netloc])
+
+    @property
+    def rest(self):
+        """host之后的部分（路径、查询参数与锚点）"""
+        rest = self.path
+        if self.query:
+            rest = ''.join([rest, '?', self.query])
+        if self.fragment:
+            rest = ''.join([rest, '#', self.fragment])
+        return rest
+
+    @property
+    def key(self):
+        """用于去重的标准化url，忽略锚点"""
+        rest = self.path.strip('/')
+        if self.query:
+            rest = ''.join([rest, '?', self.query])
+        if not rest:
+            return ''.join([self.scheme, '://', self.hostport, '/'])
+        return ''.join([self.scheme, '://', self.hostport, '/', rest, '/'])
+
+    @property
+    def hostport(self):
+        """host加上端口（未指定时为默认端口）"""
+        host = '[{}]'.format(self.host) if ':' in self.host else self.host
+        return '{}:{}'.format(host, self.port)
+
+    @property
+    def sld(self):
+        """二级域名，首次访问时计算"""
+        if self._sld is None:
+            self._sld = get_sld_from_host(self.host)
+        return self._sld
+
+    def __repr__(self):
+        return 'ParsedUrl({!r})'.format(self.url)
+
+
+@functools.lru_cache(maxsize=conf.URL_CACHE_SIZE)
+def parse_url(url):
+    """
+    解析url，同一url只解析一次
+    :param url: 待解析url，可以不带协议，如www.test.com/index.html
+    :return: ParsedUrl，url不合法时返回None
     """
     if not url:
-        return False, False, False, False
+        return None
     try:
-        protocol, rest = parse.splittype(url)
-        if protocol is None:
-            protocol = 'http'
-            rest = '//' + rest
-        host, rest = parse.splithost(rest)
-        host, port = parse.splitport(host)
-        if port is None:
-            if protocol == 'https':
-                port = '443'
-            else:
-                port = '80'
-    except Exception as err:
+        match = SCHEME_PATTERN.match(url)
+        if match:
+            scheme = match.group(1).lower()
+            split = parse.urlsplit(url)
+        else:
+            scheme = 'http'
+            split = parse.urlsplit('//' + url)
+        host = split.hostname
+        port = split.port
+    except ValueError as err:
         logger.warning('Input url is illegal: {}, error:'
                        ' {}'.format(url, err))
+        return None
+    if not host:
+        return None
+    netloc = '[{}]'.format(host) if ':' in host else host
+    if port is None:
+        port = DEFAULT_PORTS.get(scheme, 80)
+    else:
+        netloc = '{}:{}'.format(netloc, port)
+    return ParsedUrl(url, scheme, host, port, netloc, split.path,
+                     split.query, split.fragment)
+
+
+def url_cache_stats():
+    """url解析缓存的命中统计"""
+    info = parse_url.cache_info()
+    total = info.hits + info.misses
+    return {'size': info.currsize, 'hits': info.hits, 'misses': info.misses,
+            'hit_rate': round(info.hits / total, 4) if total else 0.0}
+
+
+def url_parsing_init(url):
+    """
+    url解析初始化
+    """
+    parsed = parse_url(url)
+    if parsed is None:
         return False, False, False, False
-    return protocol, host, port, rest
+    return parsed.scheme, parsed.host, str(parsed.port), parsed.rest
 
 
 def standard_url(url, with_rest=True):
@@ -58,15 +166,12 @@ def standard_url(url, with_rest=True):
     :type with_rest: bool
     :return:
     """
-    protocol, host, port, rest = url_parsing_init(url)
-    if not all([protocol, host, port]):
+    parsed = parse_url(url)
+    if parsed is None:
         return False
-    rest = rest.strip('/')
-    if with_rest and rest:
-        ret = ''.join([protocol, '://', host, ':', port, '/', rest, '/'])
-    else:
-        ret = ''.join([protocol, '://', host, ':', port, '/'])
-    return ret
+    if with_rest:
+        return parsed.key
+    return ''.join([parsed.scheme, '://', parsed.hostport, '/'])
 
 
 def get_host_from_url(url, with_port=False, with_type=False):
@@ -80,55 +185,140 @@ def get_host_from_url(url, with_port=False, with_type=False):
     :type with_type: bool
     :return:
     """
-    try:
-        protocol, res = parse.splittype(url)
-        host, res = parse.splithost(res)
-        if not host:
-            host = res
-        domain, port = parse.splitport(host)
-        if with_type:
-            domain = ''.join([protocol, '://', domain])
-        if with_port:
-            domain = ''.join([domain, ':', port])
-        return domain
-    except Exception as err:
-        logger.warning('Get host failed, url: {}, error: {}'.format(url, err))
-
-
-def guess_and_decode(content):
-    """
-    猜测并解码
-    :param content:
+    parsed = parse_url(url)
+    if parsed is None:
+        logger.warning('Get host failed, url: {}'.format(url))
+        return None
+    domain = parsed.host
+    if with_type:
+        domain = ''.join([parsed.scheme, '://', domain])
+    if with_port:
+        domain = ''.join([domain, ':', str(parsed.port)])
+    return domain
+
+
+# 从Content-Type或meta标签中提取字符集
+CHARSET_PATTERN = re.compile(br'charset\s*=\s*["\']?\s*([\w\-.:]+)', re.I)
+META_CHARSET_PATTERN = re.compile(
+    br'<meta\b[^>]*?charset\s*=\s*["\']?\s*([\w\-.:]+)', re.I)
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+# 能解码任意字节序列的编码，响应头声明这类编码时可信度较低
+WEAK_ENCODINGS = ('iso8859-1', 'latin-1')
+# 按host缓存chardet检测出的编码
+_host_encodings = {}
+
+
+def normalize_encoding(encoding):
+    """
+    规范化编码名称，无法识别的编码返回None
+    :param encoding: 编码名称
     :return:
     """
-    encoding = chardet.detect(content)['encoding']
-    if encoding == 'GB2312':
+    if not encoding:
+        return None
+    if isinstance(encoding, bytes):
+        encoding = encoding.decode('ascii', 'ignore')
+    try:
+        encoding = codecs.lookup(encoding.strip()).name
+    except LookupError:
+        return None
+    if encoding in ('gb2312', 'gbk'):
         # 扩大编码范围，防止一些特殊符号导致无法解码
-        encoding = 'GB18030'
+        encoding = 'gb18030'
+    return encoding
+
+
+def _try_decode(content, encoding):
     try:
-        content = content.decode(encoding)
-    except AttributeError:
+        return content.decode(encoding)
+    except (UnicodeDecodeError, LookupError):
+        return None
+
+
+def guess_and_decode(content, content_type=None, host=None):
+    """
+    猜测并解码，依次尝试：BOM、响应头Content-Type中的字符集、页面头部meta标签中的字符集、
+    UTF-8，均失败时使用该host之前检测出的编码，最后才使用chardet检测页面开头部分
+    :param content: 页面内容
+    :param content_type: 响应头中的Content-Type
+    :param host: 页面所属host，用于缓存检测出的编码
+    :return:
+    """
+    if isinstance(content, str):
         logger.info('The content is already str type, not need to decode.')
         return content
-    except Exception as err:
-        logger.warning('Decoding failed, now use utf-8,'
-                       ' the error: %s' % err)
-        try:
-            content = content.decode('utf-8')
-        except UnicodeDecodeError:
-            logger.warning('Cannot decode the page!')
-            return ''
-    return content
+    candidates = []
+    weak_encoding = None
+    # BOM优先于声明的字符集，否则按照声明的utf-8解码时会保留开头的BOM字符
+    for bom, encoding in BOMS:
+        if content.startswith(bom):
+            candidates.append(encoding)
+            break
+    if content_type:
+        match = CHARSET_PATTERN.search(content_type.encode('latin-1', 'ignore'))
+        if match:
+            encoding = normalize_encoding(match.group(1))
+            if encoding in WEAK_ENCODINGS:
+                # 许多服务器默认返回iso-8859-1，而它能解码任意字节，放到最后再尝试
+                weak_encoding = encoding
+            else:
+                candidates.append(encoding)
+    match = META_CHARSET_PATTERN.search(content, 0, conf.META_CHARSET_SCAN_BYTES)
+    if match:
+        candidates.append(match.group(1))
+    candidates.append('utf-8')
+    if host and host in _host_encodings:
+        candidates.append(_host_encodings[host])
+    tried = set()
+    for encoding in candidates:
+        encoding = normalize_encoding(encoding)
+        if not encoding or encoding in tried:
+            continue
+        tried.add(encoding)
+        text = _try_decode(content, encoding)
+        if text is not None:
+            return text
+
+    encoding = normalize_encoding(
+        chardet.detect(content[:conf.CHARDET_PREFIX_BYTES])['encoding'])
+    if encoding and host:
+        if len(_host_encodings) >= conf.ENCODING_CACHE_SIZE:
+            _host_encodings.clear()
+        _host_encodings[host] = encoding
+    for encoding_item in (encoding, weak_encoding):
+        if encoding_item and encoding_item not in tried:
+            text = _try_decode(content, encoding_item)
+            if text is not None:
+                return text
+    logger.warning('Decoding failed, now decode with replacement'
+                   ' characters, the encoding: %s' % encoding)
+    return content.decode(encoding or 'utf-8', 'replace')
 
 
 def is_ip(ip_str):
-    p = re.compile('^((25[0-5]|2[0-4]\d|[01]?\d\d?)\.){3}(25[0-5]|2[0-4]\d|[01]?\d\d?)$')
-    if p.match(ip_str):
+    if IP_PATTERN.match(ip_str):
         return True
     else:
         return False
 
 
+def get_sld_from_host(host):
+    """
+    从host中取出二级域名，公共后缀（如.com.cn）整体被当做是顶级域名
+    :param host: 不含端口的host
+    :return:
+    """
+    if is_ip(host):
+        return host
+    return public_suffix.get_sld(host)
+
+
 def get_sld(url_or_domain):
     """
     取出二级域名，比如www.test.com则取出test.com，同时忽略部分后缀的域名
@@ -136,17 +326,10 @@ def get_sld(url_or_domain):
     :param url_or_domain: 待检测url或域名(http://www.xxx.com:80/xxx.html)
     :return:
     """
-    # 对于类似.com.cn这种，整体被当做是顶级域名
-    current_domain = get_host_from_url(url_or_domain)
-    if is_ip(current_domain):
-        return current_domain
-    tmp_domain = current_domain
-    while (len(tmp_domain.split(".")) >= 3 and (
-                tmp_domain[tmp_domain[:tmp_domain.rfind('.')].rfind('.'):] not in cons.IGNORED_SLD_LIST)
-           or (len(tmp_domain.split(".")) > 3 and (
-                    tmp_domain[tmp_domain[:tmp_domain.rfind('.')].rfind('.'):] in cons.IGNORED_SLD_LIST))):
-        tmp_domain = tmp_domain[tmp_domain.index(".") + 1:]
-    return tmp_domain
+    parsed = parse_url(url_or_domain)
+    if parsed is None:
+        return None
+    return parsed.sld
 
 
 def is_url(url_str):
@@ -166,11 +349,14 @@ def validate_and_fill_url(current_url, link):
     :return:
     """
     ret = None
-    current_domain = get_host_from_url(current_url, with_type=True)
     if link.startswith('/') or link.startswith('.'):
+        parsed = parse_url(current_url)
+        if parsed is None:
+            return link
         link = link.rstrip('.')
-        ret = parse.urljoin(current_domain, link)
-    elif not re.match('(.+\..+)+', link) or (
+        # 保留当前页面的端口
+        ret = parse.urljoin(parsed.origin, link)
+    elif '.' not in link[1:-1] or (
                     len(link.split('.')) <= 2 and
                     link.split('.')[-1] in cons.PAGE_EXTENSION_LIST):
         ret = parse.urljoin(current_url, link)
@@ -181,20 +367,107 @@ def validate_and_fill_url(current_url, link):
     return link
 
 
-def match_url(content):
+# 文本中的url：可选的协议、至少两段的域名、可选的端口与路径
+# 前面紧邻字母数字、@、.、-、/、:的不视为url的开头（如邮箱、路径中的文件名），
+# 后面紧跟@的为邮箱的用户名部分
+URL_TEXT_PATTERN = (
+    r'(?P<url>(?<![\w@.\-/:])'
+    r'(?:(?P<scheme>(?:ht|f)tps?)://)?'
+    r'(?:[\w\-]+\.)+(?P<tld>[A-Za-z][\w\-]*|\d{1,3})(?![\w\-]*@)'
+    r'(?::\d{1,5})?'
+    r'(?:[/?#][\w\-.,@?^=%&:/~+#]*[\w\-@?^=%&/~+#])?)'
+)
+URL_PATTERN = re.compile(URL_TEXT_PATTERN, re.ASCII)
+IP_PATTERN = re.compile(
+    r'^((25[0-5]|2[0-4]\d|[01]?\d\d?)\.){3}(25[0-5]|2[0-4]\d|[01]?\d\d?)$')
+# 常见的文件扩展名及脚本中的属性名，作为最后一段时不视为域名
+NON_TLD_SUFFIXES = frozenset(
+    cons.IGNORED_EXTENSIONS + cons.PAGE_EXTENSION_LIST +
+    cons.NON_TLD_SUFFIXES)
+COMMON_TLDS = frozenset(cons.COMMON_TLDS)
+# 文本url扫描统计
+URL_SCAN_STATS = {'pages': 0, 'seconds': 0.0, 'matched': 0, 'rejected': 0}
+
+
+def accept_url_match(match):
+    """
+    判断正则匹配到的文本是否像一个url，排除版本号、文件名、脚本属性等
+    :param match: URL_TEXT_PATTERN的匹配结果
+    :return:
+    """
+    if match.group('scheme'):
+        return True
+    tld = match.group('tld').lower()
+    if tld.isdigit():
+        # 纯数字结尾只接受IPv4地址
+        return bool(IP_PATTERN.match(match.group('url').split('/', 1)[0]
+                                     .split('?', 1)[0].split(':', 1)[0]))
+    if tld in NON_TLD_SUFFIXES:
+        return False
+    return (tld in COMMON_TLDS or (len(tld) == 2 and tld.isalpha()) or
+            public_suffix.get_public_suffix_trie().is_tld(tld))
+
+
+def match_url(content, window=None, limit=None):
     """
     从文本中正则匹配url
     :param content: 待匹配文本
+    :param window: 只扫描文本开头的字符数，默认读取配置
+    :param limit: 最多返回的url数，默认读取配置
     :return:
     """
-    pattern = re.compile(
-        '((((ht|f)tps?):\/\/)?[\w\-]+(\.[\w\-]+)'
-        '+([\w\-.,@?^=%&:\/~+#]*[\w\-@?^=%&\/~+#])?)',
-        re.S
-    )
-    found_results = pattern.findall(content)
+    window = window or conf.URL_SCAN_WINDOW
+    limit = limit or conf.URL_SCAN_LIMIT
+    start = time.time()
     urls = []
-    for result in found_results:
-        url = result[0]
-        urls.append(url)
+    rejected = 0
+    for match in URL_PATTERN.finditer(content, 0, window):
+        if not accept_url_match(match):
+            rejected += 1
+            continue
+        urls.append(match.group('url'))
+        if len(urls) >= limit:
+            logger.info('Too many urls found in the text, '
+                        'only the first {} are kept'.format(limit))
+            break
+    cost = time.time() - start
+    URL_SCAN_STATS['pages'] += 1
+    URL_SCAN_STATS['seconds'] += cost
+    URL_SCAN_STATS['matched'] += len(urls)
+    URL_SCAN_STATS['rejected'] += rejected
+    logger.debug('Scan urls from text cost {:.2f}ms, matched: {}, '
+                 'rejected: {}'.format(cost * 1000, len(urls), rejected))
     return urls
+
+
+class LoopLocal(object):
+    """
+    按事件循环分别保存的状态，同一进程中多个线程各自运行事件循环时互不影响
+    事件循环关闭之后，其对应的状态在之后新建状态时清除
+    """
+
+    def __init__(self, factory):
+        """
+        :param factory: 为新的事件循环创建状态的无参函数
+        """
+        self._factory = factory
+        self._values = {}
+
+    def get(self):
+        """获取当前事件循环的状态，没有则创建"""
+        loop = asyncio.get_event_loop()
+        value = self._values.get(loop)
+        if value is None:
+            for closed in [item for item in list(self._values)
+                           if item.is_closed()]:
+                self._values.pop(closed, None)
+            value = self._values[loop] = self._factory()
+        return value
+
+    def peek(self):
+        """获取当前事件循环的状态，没有则返回None"""
+        return self._values.get(asyncio.get_event_loop())
+
+    def pop(self):
+        """取出并删除当前事件循环的状态，没有则返回None"""
+        return self._values.pop(asyncio.get_event_loop(), None)
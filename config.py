@@ -12,19 +12,105 @@ RESULT_NUM_EACH_SITE = 10
 PROCESS_NUM = 8
 # 每个进程的协程并发数限制
 CONCURRENT_LIMIT = 32
+# 是否将页面解码、无用页面判断与链接解析交由进程池执行，
+# 开启后cli只启动一个负责网络IO的进程，不再按PROCESS_NUM启动多个爬虫进程
+CPU_OFFLOAD = False
+# 进程池的进程数，为空则使用CPU核数
+CPU_WORKERS = None
+# 小于该字节数的页面直接在事件循环中解码，避免进程间传输的开销
+CPU_OFFLOAD_MIN_BYTES = 16 * 1024
+# 每个站点同时处理url的工作协程数上限
+FRONTIER_WORKERS = 16
+# 指定了请求间隔(time_wait)时，同一host允许连续发出的请求数
+POLITENESS_BURST = 1
+# 限速调度器记录的host数上限
+POLITENESS_MAX_HOSTS = 100000
+# 进程内共享连接池的总连接数上限（0表示不限制）与单个host的连接数上限
+CONNECTOR_LIMIT = 256
+CONNECTOR_LIMIT_PER_HOST = 32
+# 空闲keep-alive连接的保持时间(单位：秒)
+KEEPALIVE_TIMEOUT = 30
+# 关闭会话时等待SSL连接关闭的时间(单位：秒)
+SESSION_CLOSE_GRACE = 0.25
+# DNS解析缓存的有效期与解析失败的缓存有效期(单位：秒)
+DNS_CACHE_TTL = 300
+DNS_NEGATIVE_TTL = 60
+# DNS解析缓存的最大记录数
+DNS_CACHE_SIZE = 100000
+# 预解析DNS时的并发数
+DNS_PREFETCH_CONCURRENCY = 64
 LOG_DIR = 'log'
 TRY_TO_DECODE = True
+# 在页面开头多少字节内查找meta标签声明的字符集
+META_CHARSET_SCAN_BYTES = 4096
+# 其他方式均无法确定编码时，chardet检测的页面开头字节数
+CHARDET_PREFIX_BYTES = 32 * 1024
+# 按host缓存检测出的编码的最大host数
+ENCODING_CACHE_SIZE = 10000
+# 页面内链接的解析方式，pyquery：构建DOM树解析，fast：单次扫描页面文本解析
+LINK_EXTRACTOR = 'pyquery'
+# 从页面文本中匹配url时，只扫描开头的字符数以及最多保留的url数
+URL_SCAN_WINDOW = 512 * 1024
+URL_SCAN_LIMIT = 2000
+# 允许下载的响应类型，为空则不限制；响应头中没有Content-Type时也会下载
+ALLOWED_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+# 响应头中Content-Length超过该值(单位：字节)的响应不下载，为0则不限制
+MAX_CONTENT_LENGTH = 10 * 1024 * 1024
+# 分块读取响应内容时每块的字节数
+READ_CHUNK_SIZE = 64 * 1024
+# 单个页面最多读取的字节数，超出部分被截断，为0则不限制
+MAX_PAGE_BYTES = 10 * 1024 * 1024
+# 每个站点最多下载的总字节数，用完后不再下载该站点的页面，为0则不限制
+SITE_BYTE_BUDGET = 1024 * 1024 * 1024
+# 是否在读取响应内容时直接匹配未解码的字节来判定无用页面，判定为无用的页面不再解码与解析
+USELESS_STREAM_DETECT = True
+# 匹配未解码的字节时，无用页面特征的候选编码
+USELESS_FEATURE_ENCODINGS = ('utf-8', 'gb18030')
+# 页面内跳转只扫描开头的字符数；页面超过该长度时只认可meta标签的跳转
+REDIRECT_SCAN_WINDOW = 32 * 1024
+REDIRECT_JS_MAX_LENGTH = 2048
+# 解析结果缓存的url数
+URL_CACHE_SIZE = 100000
 CRAWL_TIMEOUT = 5 * 60
 # 指定user-agent，若不指定则为随机
 SPECIFIED_USER_AGENT = None
+# 未指定user-agent时的选取方式，random：按浏览器占比随机，rotate：轮换
+UA_MODE = 'random'
+# 同一host是否固定使用同一个user-agent，以及最多记录的host数
+UA_STICKY_PER_HOST = True
+UA_STICKY_HOSTS = 10000
+# 已爬取url的去重存储方式，set：哈希集合（精确），bloom：布隆过滤器（内存固定，存在误判）
+SEEN_STORE_MODE = 'set'
+# 布隆过滤器的预计容量与误判率
+BLOOM_CAPACITY = 100000
+BLOOM_ERROR_RATE = 0.0001
+# 是否保存页面的ETag/Last-Modified并在再次爬取时发送条件请求，未修改(304)的页面沿用上次的链接
+CONDITIONAL_RECRAWL = True
+# 未使用支持保存校验信息的数据管道时，校验信息保存在输出目录下的该索引文件中
+VALIDATOR_INDEX_NAME = '.validators.json'
+
+# 爬取记录的写入间隔(单位：秒)与触发立即写入的缓存记录数
+JOURNAL_FLUSH_INTERVAL = 1
+JOURNAL_BATCH_SIZE = 1000
 
 PID_DIR = 'pid'
 DATA_DIR = 'data'
 FAKE_UA_DATA_PATH = 'data/fake_useragent_0.1.11.json'
 DEFAULT_INPUT_PATH = 'data/sites_for_collect.txt'
+# 公共后缀列表，用于计算二级域名，来自https://publicsuffix.org/list/public_suffix_list.dat
+PUBLIC_SUFFIX_DATA_PATH = 'data/public_suffix_list.dat'
+# 是否使用公共后缀列表中的私有域名部分（如github.io下的每个子域名视为独立的二级域名）
+PUBLIC_SUFFIX_PRIVATE = False
+# 缓存二级域名计算结果的域名数
+SLD_CACHE_SIZE = 100000
 DEFAULT_OUTPUT_DIR = 'output'
 # 是否使用bs64编码的url作为文件名（只在使用默认文件存储数据管道时生效）
 BS64_FILENAME = False
+# 默认文件存储的写入线程数、排队等待写入的页面数上限
+FILE_SINK_WORKERS = 4
+FILE_SINK_MAX_PENDING = 256
+# 每写入多少个文件统一fsync一次，为0则不主动fsync
+FILE_SINK_FSYNC_BATCH = 0
 
 # splash服务
 USE_SPLASH = False
@@ -32,17 +118,56 @@ ENABLE_IMAGE = 0
 SPLASH_TIMEOUT = 30
 SPLASH_URL = 'http://localhost:8050'
 SPLASH_RENDER = SPLASH_URL + '/render.html'
+SPLASH_EXECUTE = SPLASH_URL + '/execute'
+# 同时进行的splash渲染请求数，不占用爬虫的并发数
+SPLASH_CONCURRENCY = 4
+# 每次请求渲染的url数，大于1时通过/execute的Lua脚本依次渲染（splash需要设置足够大的--max-timeout）
+SPLASH_BATCH_SIZE = 1
+# 合并渲染时等待更多url入队的时间(单位：秒)
+SPLASH_BATCH_WAIT = 0.05
+# 合并渲染时每个页面加载之后等待的时间(单位：秒)
+SPLASH_WAIT = 0.5
+# 渲染任务从入队到完成的最长时间(单位：秒)
+SPLASH_QUEUE_TIMEOUT = 120
+# 渲染请求的超时时间在splash超时时间之上额外增加的时间(单位：秒)
+SPLASH_TIMEOUT_MARGIN = 10
+# 渲染耗时统计中新观测值的权重
+SPLASH_EWMA_ALPHA = 0.2
+# 使用splash时的渲染方式，always：所有页面均渲染，hybrid：先直接下载，只渲染需要执行脚本的页面
+SPLASH_MODE = 'hybrid'
+# 判断是否需要渲染时扫描页面开头的字符数
+RENDER_SCAN_WINDOW = 256 * 1024
+# 含有脚本且body中可见文本少于该字符数的页面需要渲染
+RENDER_MIN_TEXT_LENGTH = 50
+# 同一host至少判定该数量的页面且需要渲染的比例达到该值时，该host的页面直接渲染
+RENDER_HOST_MIN_PAGES = 5
+RENDER_HOST_RATIO = 0.9
+# 记录渲染判定结果的host数
+RENDER_DECISION_HOSTS = 10000
 
 # IP代理池
 USE_IP_PROXY = False
-# IP失效之后的更换代理IP次数
+# 每个请求最多尝试的代理IP数
 PROXY_TRIED_TIMES = 10
-# 请求失败之后的尝试次数
-RETRY_TIMES = 3
 IP_PROXY_URL = 'http://localhost:5010'
 GET_ONE_PROXY_IP_URL = IP_PROXY_URL + '/get'
 GET_ALL_PROXY_IPS_URL = IP_PROXY_URL + '/get_all'
 DELETE_PROXY_IP_URL = IP_PROXY_URL + '/delete'
+# 代理列表的刷新间隔(单位：秒)
+PROXY_REFRESH_INTERVAL = 60
+# 代理成功率与延迟的指数加权移动平均中新观测值的权重
+PROXY_EWMA_ALPHA = 0.3
+# 尚无延迟记录的代理按该延迟(单位：秒)计算权重
+PROXY_DEFAULT_LATENCY = 1.0
+# 连续失败该次数的代理被隔离一段时间(单位：秒)
+PROXY_MAX_FAILURES = 3
+PROXY_QUARANTINE_TIME = 60
+# 成功率低于该值的代理从代理池中删除
+PROXY_EVICT_SCORE = 0.2
+# 每个代理的连接池大小
+PROXY_CONNECTOR_LIMIT = 32
+# 使用代理时响应这些状态码视为代理不可用（需要认证、代理无法连接或等待上游超时）
+PROXY_FAILURE_STATUS = (407, 502, 503, 504)
 
 # ------------Redis相关设置---------------
 REDIS_HOST = 'localhost'
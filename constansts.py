@@ -57,6 +57,27 @@ IGNORED_SLD_LIST = [".ac.cn", ".com.cn", ".org.cn", ".net.cn", ".gov.cn", ".mil.
 # 常见的页面扩展名
 PAGE_EXTENSION_LIST = ['html', 'htm', 'php', 'asp', 'aspx', 'jsp', 'shtml', 'nsp', 'cgi']
 
+# 文本中匹配url时，最后一段为这些值的不视为域名（文件扩展名、脚本中常见的属性名）
+NON_TLD_SUFFIXES = [
+    'js', 'json', 'txt', 'xml', 'ico', 'woff', 'woff2', 'ttf', 'eot', 'map',
+    'py', 'sh', 'ts', 'md', 'log', 'gz', 'tar', '7z', 'dll', 'jar', 'war',
+    'do', 'action', 'htm', 'id', 'css', 'min', 'prototype', 'length',
+    'href', 'src', 'value', 'style', 'test'
+]
+
+# 文本中匹配不带协议的url时接受的常见顶级域名（两个字母的国家顶级域名均接受）
+COMMON_TLDS = [
+    'com', 'net', 'org', 'edu', 'gov', 'mil', 'int', 'info', 'biz', 'name',
+    'pro', 'top', 'xyz', 'site', 'online', 'club', 'shop', 'store', 'vip',
+    'wang', 'ren', 'ltd', 'tech', 'cloud', 'app', 'dev', 'asia', 'mobi',
+    'work', 'link', 'live', 'news', 'group', 'city', 'ink', 'fun', 'icu',
+    'space', 'website', 'press', 'host', 'art', 'love', 'red', 'kim',
+    'beer', 'market', 'law', 'company', 'team', 'design', 'video', 'today',
+    'world', 'center', 'email', 'social', 'technology', 'network', 'studio',
+    'museum', 'aero', 'coop', 'travel', 'jobs', 'tel', 'cat', 'post',
+    '中国', '公司', '网络',
+]
+
 # 页面中包含如下语句则舍弃
 USELESS_PAGE_FEATURE = [
     '网站维护中',
@@ -126,3 +147,13 @@ USELESS_PAGE_FEATURE = [
     '使用浏览器请使用及以上版本确保本地时间的准确性请观察这个时'
     '间若时间一直未变化则是由于验证页面被缓存可能是与设置不兼容',
 ]
+
+# 无用页面特征中表示页面内容由脚本加载的部分，静态页面包含这些特征时交由splash渲染
+RENDER_PAGE_FEATURE = [
+    '内容读取中',
+    '页面载入中',
+    '访问本页面您的浏览器需要支持',
+    'loading...',
+    '请开启并刷新该页',
+    '浏览器不支持请手动刷新页面',
+]
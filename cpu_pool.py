@@ -0,0 +1,173 @@
+"""
+CPU密集型的页面处理（解码、无用页面判断、链接解析）交由进程池执行，
+网络IO仍在事件循环中进行
+"""
+import asyncio
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+from loguru import logger
+
+import common as cm
+import config as conf
+import constansts as cons
+
+from ahocorasick import get_automaton
+from link_extractor import extract_links
+
+_executor = None
+_executor_failed = False
+# 编码后的无用页面特征 -> 原特征
+_useless_byte_features = {}
+# 无用页面的长度上限，字节数小于该值时字符数必然也小于该值
+USELESS_PAGE_MAX_LENGTH = 1000
+
+
+def get_cpu_executor():
+    """
+    获取进程内共享的进程池，未开启或无法创建（如当前进程为守护进程）时返回None
+    """
+    global _executor, _executor_failed
+    if not conf.CPU_OFFLOAD or _executor_failed:
+        return None
+    if _executor is None:
+        workers = conf.CPU_WORKERS or os.cpu_count() or 1
+        try:
+            _executor = ProcessPoolExecutor(max_workers=workers)
+        except (AssertionError, OSError) as err:
+            logger.warning('Create cpu process pool failed, now process '
+                           'pages in the event loop, error: {}'.format(err))
+            _executor_failed = True
+            return None
+        logger.info('Create cpu process pool with {} workers'.format(workers))
+    return _executor
+
+
+def close_cpu_executor():
+    """关闭进程池"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+async def run_cpu_task(func, *args):
+    """
+    在进程池中执行函数，未开启进程池时直接执行
+    :param func: 模块级函数（需要能被pickle）
+    :param args: 函数参数
+    :return:
+    """
+    executor = get_cpu_executor()
+    if executor is None:
+        return func(*args)
+    return await asyncio.get_event_loop().run_in_executor(
+        executor, func, *args)
+
+
+def is_useless_page(page_text, ac=None):
+    """
+    判断是否为无用页面：页面较短且包含无用页面特征
+    :param page_text: 解码之后的页面内容
+    :param ac: 无用页面特征的自动机，为空则使用当前进程中构建的自动机
+    :return:
+    """
+    if len(page_text) >= USELESS_PAGE_MAX_LENGTH:
+        return False
+    if ac is None:
+        ac = get_automaton(cons.USELESS_PAGE_FEATURE, 'useless')
+    return ac.contains(page_text)
+
+
+def get_useless_byte_automaton():
+    """
+    获取按各候选编码编码之后的无用页面特征构建的自动机，可直接匹配未解码的响应内容
+    """
+    if not _useless_byte_features:
+        for feature in cons.USELESS_PAGE_FEATURE:
+            for encoding in conf.USELESS_FEATURE_ENCODINGS:
+                try:
+                    encoded = feature.encode(encoding)
+                except UnicodeError:
+                    continue
+                _useless_byte_features.setdefault(encoded, feature)
+    return get_automaton(list(_useless_byte_features), 'useless_bytes')
+
+
+class UselessPageDetector(object):
+    """
+    在分块读取响应内容时匹配无用页面特征，作为aio_request的on_chunk使用
+    页面读取完毕时若总字节数小于无用页面的长度上限且包含特征，则中止后续的解码与链接解析
+    """
+
+    def __init__(self):
+        self._ac = get_useless_byte_automaton()
+        self._state = 0
+        self.received = 0
+        self.matched = None
+
+    @property
+    def feature(self):
+        """匹配到的原无用页面特征"""
+        if self.matched is None:
+            return None
+        return _useless_byte_features[self.matched]
+
+    def reset(self):
+        """重新开始匹配（如请求重试时）"""
+        self._state = 0
+        self.received = 0
+        self.matched = None
+
+    def __call__(self, chunk, at_eof):
+        """
+        :param chunk: 新读取的一块内容
+        :param at_eof: 是否已读取完毕
+        :return: 是否中止
+        """
+        self.received += len(chunk)
+        if self.received >= USELESS_PAGE_MAX_LENGTH:
+            # 超出长度上限的页面不可能按字节判定为无用页面，不再匹配
+            return False
+        if self.matched is None and chunk:
+            self._state, self.matched = self._ac.advance(chunk, self._state)
+        if at_eof and self.matched is not None:
+            logger.debug('Useless page feature found before decoding: '
+                         '{}'.format(self.feature))
+            return True
+        return False
+
+
+def classify_and_extract(url, page_content, page_text,
+                         level, extractor, extract=True):
+    """
+    判断页面是否无用，并解析页面内链接
+    :param url: 页面url
+    :param page_content: 页面内容
+    :param page_text: 解码之后的页面内容
+    :param level: 爬取级别
+    :param extractor: 链接解析方式
+    :param extract: 是否解析页面内链接
+    :return: (是否为无用页面, 链接元组)
+    """
+    if is_useless_page(page_text):
+        return True, ()
+    if not extract:
+        return False, ()
+    return False, tuple(
+        extract_links(url, page_content, page_text, level, extractor))
+
+
+async def decode_content(content, content_type=None, host=None):
+    """
+    解码页面内容，较大的页面在进程池中解码
+    :param content: 页面内容
+    :param content_type: 响应头中的Content-Type
+    :param host: 页面所属host
+    :return:
+    """
+    if len(content) < conf.CPU_OFFLOAD_MIN_BYTES:
+        return cm.guess_and_decode(content, content_type, host)
+    return await run_cpu_task(
+        cm.guess_and_decode, content, content_type, host)
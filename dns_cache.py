@@ -0,0 +1,134 @@
+"""
+带TTL缓存的异步DNS解析，解析结果在进程内所有会话之间共享
+"""
+import asyncio
+import socket
+import time
+
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+from loguru import logger
+
+import common as cm
+import config as conf
+
+# 进程内共享的解析缓存：(host, family) -> (过期时间, 解析结果或异常)
+_cache = {}
+
+
+def _lookup(key):
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    if entry[0] < time.monotonic():
+        _cache.pop(key, None)
+        return None
+    return entry
+
+
+def _store(key, ttl, value):
+    if len(_cache) >= conf.DNS_CACHE_SIZE:
+        now = time.monotonic()
+        for expired_key in [k for k, v in _cache.items() if v[0] < now]:
+            del _cache[expired_key]
+        while len(_cache) >= conf.DNS_CACHE_SIZE:
+            # 淘汰最早写入的记录
+            del _cache[next(iter(_cache))]
+    _cache[key] = (time.monotonic() + ttl, value)
+
+
+def is_cached(host, family=socket.AF_UNSPEC):
+    """该host是否已有有效的解析缓存"""
+    return _lookup((host, family)) is not None
+
+
+class CachingResolver(AbstractResolver):
+    """
+    在aiohttp默认解析器之上增加TTL缓存与解析失败的负缓存，
+    同一host的并发解析请求只会发起一次
+    """
+
+    def __init__(self):
+        self._resolver = DefaultResolver()
+        self._pending = {}
+        # 限制后台预解析的并发数
+        self.prefetch_semaphore = asyncio.Semaphore(
+            conf.DNS_PREFETCH_CONCURRENCY)
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        key = (host, family)
+        entry = _lookup(key)
+        if entry is None:
+            future = self._pending.get(key)
+            if future is None:
+                future = asyncio.ensure_future(self._resolve(key))
+                self._pending[key] = future
+                future.add_done_callback(
+                    lambda _: self._pending.pop(key, None))
+            await asyncio.shield(future)
+            entry = _lookup(key)
+            if entry is None:
+                # TTL被配置为0时不会写入缓存，直接重新解析
+                return await self._resolver.resolve(host, port, family)
+        result = entry[1]
+        if isinstance(result, Exception):
+            raise result
+        return [dict(item, port=port) for item in result]
+
+    async def _resolve(self, key):
+        host, family = key
+        try:
+            result = await self._resolver.resolve(host, 0, family)
+        except OSError as err:
+            logger.info('Resolve host failed: {}, error: {}'.format(host, err))
+            _store(key, conf.DNS_NEGATIVE_TTL, err)
+        else:
+            _store(key, conf.DNS_CACHE_TTL, result)
+
+    async def close(self):
+        await self._resolver.close()
+
+
+# 每个事件循环使用各自的解析器，解析缓存仍在进程内共享
+_resolvers = cm.LoopLocal(CachingResolver)
+
+
+def get_resolver():
+    """获取当前事件循环下的解析器"""
+    return _resolvers.get()
+
+
+async def _prefetch_one(resolver, host):
+    async with resolver.prefetch_semaphore:
+        try:
+            # 与连接池发起解析时使用的地址族保持一致，保证命中缓存
+            await resolver.resolve(host, family=socket.AF_UNSPEC)
+        except OSError:
+            pass
+
+
+async def prefetch(hosts):
+    """
+    预先解析一批host，结果写入缓存供之后的请求直接使用
+    :param hosts: host列表
+    :return:
+    """
+    resolver = get_resolver()
+    hosts = {host for host in hosts if host and not is_cached(host)}
+    if not hosts:
+        return
+    logger.info('Prefetch dns for {} hosts'.format(len(hosts)))
+    await asyncio.gather(*[_prefetch_one(resolver, host) for host in hosts])
+
+
+def prefetch_nowait(hosts):
+    """
+    在后台预先解析一批host，不等待解析完成
+    :param hosts: host列表
+    :return:
+    """
+    resolver = get_resolver()
+    for host in set(hosts):
+        if (host and not is_cached(host)
+                and (host, socket.AF_UNSPEC) not in resolver._pending):
+            asyncio.ensure_future(_prefetch_one(resolver, host))
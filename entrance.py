@@ -10,6 +10,11 @@ from loguru import logger
 
 import common as cm
 from exceptions import DupSpidersError
+from cpu_pool import close_cpu_executor
+from file_sink import close_file_sink
+from http_session import close_session
+from proxy_manager import close_proxy_manager
+from splash_pool import close_splash_pool
 from _spider import DEFAULT_SPIDER_NAME
 
 sys.path.append('spiders')
@@ -66,8 +71,7 @@ def crawl_one_site(url, base_output_dir, max_depth,
     semaphore = asyncio.Semaphore(value=concurrent_limit)
     domain = cm.get_host_from_url(url)
     output_dir = os.path.join(base_output_dir, domain)
-    if not os.path.isdir(output_dir):
-        os.system('mkdir -p %s' % output_dir)
+    os.makedirs(output_dir, exist_ok=True)
     if not spider:
         spider = DEFAULT_SPIDER_NAME
     spiders = load_spiders()
@@ -95,14 +99,17 @@ def crawl_one_site(url, base_output_dir, max_depth,
     pipelines = load_pipelines()
     for PClass in pipelines:
         if spider in PClass.__spiders__ or PClass.__spiders__ is None:
-            pipeline = PClass()
-            for method in dir(pipeline):
-                if method.startswith('pipe_'):
-                    # 拥有可执行管道方法则添加管道
-                    spider_obj.add_pipeline(pipeline)
-                    break
+            # 拥有可执行管道方法则添加管道
+            spider_obj.add_pipeline(PClass())
     try:
-        spider_obj.run()
+        event_loop.run_until_complete(spider_obj.run())
     except:
         logger.error('Error occurred while running: '
                      '{}'.format(traceback.format_exc()))
+    finally:
+        event_loop.run_until_complete(close_proxy_manager())
+        event_loop.run_until_complete(close_splash_pool())
+        event_loop.run_until_complete(close_session())
+        event_loop.run_until_complete(close_file_sink())
+        event_loop.close()
+        close_cpu_executor()
@@ -20,3 +20,9 @@ class DupSpidersError(Exception):
 
     def __str__(self):
         return self.value
+
+
+class ProxyUnavailableError(SpiderError):
+    """没有可用的代理或尝试的代理均请求失败"""
+    def __init__(self, message='No proxy is available!'):
+        SpiderError.__init__(self, message)
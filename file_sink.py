@@ -0,0 +1,179 @@
+"""
+页面文件的异步写入，由线程池在后台写入磁盘，避免阻塞事件循环
+"""
+import asyncio
+import functools
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+import common as cm
+import config as conf
+
+
+class _PendingWrites(object):
+    """一个事件循环中提交的写入任务，以及限制其排队数的信号量"""
+
+    def __init__(self, max_pending):
+        self.slots = asyncio.Semaphore(max_pending)
+        self.futures = set()
+
+
+class FileSink(object):
+    """
+    将页面写入文件的后台写入器
+    待写入的页面数超过上限时，写入方需要等待，从而在磁盘较慢时对爬虫形成反压
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, fsync_batch=None):
+        """
+        :param max_workers: 写入线程数
+        :param max_pending: 允许排队等待写入的页面数上限
+        :param fsync_batch: 每写入多少个文件统一fsync一次，为0则不主动fsync
+        """
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or conf.FILE_SINK_WORKERS)
+        self._max_pending = max_pending or conf.FILE_SINK_MAX_PENDING
+        self._fsync_batch = (conf.FILE_SINK_FSYNC_BATCH
+                             if fsync_batch is None else fsync_batch)
+        # 每个事件循环分别限制排队数，写入线程池与落盘在进程内共享
+        self._pending = cm.LoopLocal(
+            functools.partial(_PendingWrites, self._max_pending))
+        self._lock = threading.Lock()
+        self._known_dirs = set()
+        # 已写入但尚未fsync的文件：(文件描述符, 所在目录)
+        self._unsynced = []
+        self.written = 0
+        self.failed = 0
+
+    @property
+    def pending(self):
+        """当前事件循环中排队与正在写入的页面数"""
+        writes = self._pending.peek()
+        return len(writes.futures) if writes is not None else 0
+
+    def stats(self):
+        """写入统计"""
+        return {'pending': self.pending, 'written': self.written,
+                'failed': self.failed}
+
+    async def put(self, path, content, on_written=None):
+        """
+        提交一个写入任务，排队数达到上限时等待
+        :param path: 文件路径
+        :param content: 文件内容(str或bytes)
+        :param on_written: 写入成功之后在事件循环中调用的无参函数
+        :return:
+        """
+        writes = self._pending.get()
+        if writes.slots.locked():
+            logger.info('File sink is busy, pending writes: {}, '
+                        'now wait for the disk'.format(len(writes.futures)))
+        await writes.slots.acquire()
+        future = asyncio.get_event_loop().run_in_executor(
+            self._executor, self._write, path, content)
+        writes.futures.add(future)
+        future.add_done_callback(
+            functools.partial(self._on_done, writes, on_written))
+
+    def _on_done(self, writes, on_written, future):
+        writes.futures.discard(future)
+        writes.slots.release()
+        err = None if future.cancelled() else future.exception()
+        with self._lock:
+            if future.cancelled() or err is not None:
+                self.failed += 1
+            else:
+                self.written += 1
+        if err is not None:
+            logger.error('Write page to file failed, error: {}'.format(err))
+        elif on_written is not None and not future.cancelled():
+            on_written()
+
+    def _ensure_dir(self, dirname):
+        if dirname in self._known_dirs:
+            return
+        os.makedirs(dirname, exist_ok=True)
+        with self._lock:
+            self._known_dirs.add(dirname)
+
+    def _write(self, path, content):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        dirname = os.path.dirname(path)
+        self._ensure_dir(dirname)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(content)
+            while view:
+                view = view[os.write(fd, view):]
+        except Exception:
+            os.close(fd)
+            raise
+        if not self._fsync_batch:
+            os.close(fd)
+            return
+        batch = None
+        with self._lock:
+            self._unsynced.append((fd, dirname))
+            if len(self._unsynced) >= self._fsync_batch:
+                batch, self._unsynced = self._unsynced, []
+        if batch:
+            self._sync(batch)
+
+    @staticmethod
+    def _sync(batch):
+        dirs = set()
+        for fd, dirname in batch:
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            dirs.add(dirname)
+        for dirname in dirs:
+            # 同时fsync目录，保证新建的文件项落盘
+            dir_fd = os.open(dirname, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    async def drain(self):
+        """等待当前事件循环中已提交的写入完成"""
+        writes = self._pending.peek()
+        if writes is not None and writes.futures:
+            await asyncio.gather(*list(writes.futures), return_exceptions=True)
+
+    def sync(self):
+        """fsync所有尚未落盘的文件"""
+        with self._lock:
+            batch, self._unsynced = self._unsynced, []
+        if batch:
+            self._sync(batch)
+
+    async def close(self):
+        """等待当前事件循环中的写入完成并落盘"""
+        await self.drain()
+        self._pending.pop()
+        await asyncio.get_event_loop().run_in_executor(
+            self._executor, self.sync)
+
+
+_sink = None
+
+
+def get_file_sink():
+    """获取进程内共享的文件写入器"""
+    global _sink
+    if _sink is None:
+        _sink = FileSink()
+    return _sink
+
+
+async def close_file_sink():
+    """等待当前事件循环中提交的页面写入完成"""
+    if _sink is not None:
+        await _sink.close()
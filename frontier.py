@@ -0,0 +1,94 @@
+"""
+爬取队列，由固定上限数量的工作协程持续从队列中获取url进行处理
+"""
+import asyncio
+import itertools
+import traceback
+
+from loguru import logger
+
+
+class Frontier(object):
+    """
+    带深度标记的待爬取队列
+    每个url携带自己的深度，处理完成后其子链接以深度+1入队，
+    不再需要等待同一层级的所有页面处理完毕才进入下一层级；
+    队列按深度优先取出较浅的url，使url尽量以最短路径的深度被爬取
+    """
+
+    def __init__(self, handler, max_workers, admit=None):
+        """
+        :param handler: 处理协程，形如 handler(url, depth)，返回需要继续爬取的子链接
+        :param max_workers: 工作协程数量上限
+        :param admit: 入队前的去重函数，形如 admit(url, depth)，返回假值的url不再入队
+        """
+        if max_workers < 1:
+            raise ValueError('The max workers of frontier must be positive,'
+                             ' but now is: {}'.format(max_workers))
+        self._handler = handler
+        self._admit = admit
+        self._max_workers = max_workers
+        self._queue = None
+        # 同一深度的url按照入队顺序取出
+        self._seq = itertools.count()
+        self._workers = []
+        self._idle = 0
+
+    @property
+    def size(self):
+        """队列中待处理的url数量"""
+        return self._queue.qsize() if self._queue else 0
+
+    def put(self, url, depth):
+        """
+        加入待爬取url，当没有空闲的工作协程且未达到上限时新建工作协程
+        :param url: 待爬取url
+        :param depth: 该url所处深度
+        :return: 是否已入队
+        """
+        if self._admit is not None and not self._admit(url, depth):
+            return False
+        self._queue.put_nowait((depth, next(self._seq), url))
+        if not self._idle and len(self._workers) < self._max_workers:
+            self._workers.append(asyncio.ensure_future(self._work()))
+        return True
+
+    async def _work(self):
+        while True:
+            self._idle += 1
+            try:
+                depth, _, url = await self._queue.get()
+            finally:
+                self._idle -= 1
+            try:
+                links = await self._handler(url, depth)
+                if links:
+                    for link in links:
+                        self.put(link, depth + 1)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.error('Error occurred while handling url: {}, '
+                             'error: {}'.format(url, traceback.format_exc()))
+            finally:
+                self._queue.task_done()
+
+    async def run(self, seeds, depth=1):
+        """
+        从种子url开始爬取，直到队列中的所有url处理完毕
+        :param seeds: 种子url列表
+        :param depth: 种子url的深度
+        :return:
+        """
+        self._queue = asyncio.PriorityQueue()
+        self._workers = []
+        self._idle = 0
+        for url in seeds:
+            self.put(url, depth)
+        try:
+            await self._queue.join()
+        finally:
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            self._workers = []
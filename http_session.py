@@ -0,0 +1,81 @@
+"""
+进程内共享的HTTP会话，复用连接池、keep-alive连接与TLS会话
+"""
+import asyncio
+
+import aiohttp
+
+from aiohttp import ClientTimeout
+from loguru import logger
+
+import common as cm
+import config as conf
+
+from dns_cache import get_resolver
+
+
+class SessionManager(object):
+    """
+    管理当前进程中的aiohttp会话，会话与创建它的事件循环绑定，
+    每个事件循环（如多个工作线程各自的事件循环）使用各自的会话
+    """
+
+    def __init__(self):
+        self._sessions = cm.LoopLocal(self._create_session)
+
+    @staticmethod
+    def create_connector(**kwargs):
+        """
+        创建连接池
+        :param kwargs: 覆盖默认配置的TCPConnector参数
+        :return:
+        """
+        options = {
+            'limit': conf.CONNECTOR_LIMIT,
+            'limit_per_host': conf.CONNECTOR_LIMIT_PER_HOST,
+            'keepalive_timeout': conf.KEEPALIVE_TIMEOUT,
+            'enable_cleanup_closed': True,
+            'ssl': False,
+            # 使用进程内共享缓存的解析器，关闭连接池自带的DNS缓存
+            'resolver': get_resolver(),
+            'use_dns_cache': False,
+        }
+        options.update(kwargs)
+        return aiohttp.TCPConnector(**options)
+
+    def _create_session(self):
+        logger.debug('Create http session for the current event loop')
+        return aiohttp.ClientSession(
+            connector=self.create_connector(),
+            timeout=ClientTimeout(total=conf.CRAWL_TIMEOUT)
+        )
+
+    def get_session(self):
+        """获取当前事件循环下的共享会话"""
+        session = self._sessions.get()
+        if session.closed:
+            self._sessions.pop()
+            session = self._sessions.get()
+        return session
+
+    async def close(self):
+        """关闭当前事件循环下的会话并释放连接"""
+        session = self._sessions.pop()
+        if session is None or session.closed:
+            return
+        await session.close()
+        # 给予SSL连接完成关闭握手的时间
+        await asyncio.sleep(conf.SESSION_CLOSE_GRACE)
+
+
+session_manager = SessionManager()
+
+
+def get_session():
+    """获取进程内共享的会话"""
+    return session_manager.get_session()
+
+
+async def close_session():
+    """关闭当前事件循环下的共享会话"""
+    await session_manager.close()
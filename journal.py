@@ -0,0 +1,117 @@
+"""
+爬取记录日志，在内存中批量缓存记录并由后台线程定期写入文件
+"""
+import atexit
+import os
+import threading
+
+from loguru import logger
+
+import config as conf
+
+JOURNAL_PREFIX = 'record'
+
+
+class CrawlJournal(object):
+    """
+    爬取结果记录，每个进程写入独立的分段文件(record.<pid>.txt)，因此无需文件锁
+    每行记录格式为：状态\\t深度\\t字节数\\t耗时(毫秒)\\turl
+    """
+
+    def __init__(self, base_dir, flush_interval=None, batch_size=None):
+        """
+        :param base_dir: 记录文件所在目录
+        :param flush_interval: 定期写入的间隔(单位：秒)
+        :param batch_size: 缓存记录达到该数量时立即写入
+        """
+        self.path = os.path.join(base_dir, '{}.{}.txt'.format(
+            JOURNAL_PREFIX, os.getpid()))
+        self._flush_interval = flush_interval or conf.JOURNAL_FLUSH_INTERVAL
+        self._batch_size = batch_size or conf.JOURNAL_BATCH_SIZE
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._file = None
+        self._thread = threading.Thread(
+            target=self._run, name='crawl-journal', daemon=True)
+        self._thread.start()
+
+    def record(self, status, url, depth=0, size=0, latency=0.0):
+        """
+        记录一个url的爬取结果
+        :param status: 爬取状态，如Success、Failed
+        :param url: 爬取的url
+        :param depth: url所处深度
+        :param size: 页面字节数
+        :param latency: 下载耗时(单位：秒)
+        :return:
+        """
+        line = '{}\t{}\t{}\t{}\t{}\n'.format(
+            status, depth, size, int(latency * 1000), url)
+        with self._lock:
+            self._buffer.append(line)
+            full = len(self._buffer) >= self._batch_size
+        if full:
+            self._wakeup.set()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self._flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """将缓存的记录写入文件"""
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        if not lines:
+            return
+        with self._write_lock:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, 'a')
+                self._file.write(''.join(lines))
+                self._file.flush()
+            except OSError as err:
+                logger.error('Write crawl journal "{}" failed, {} records'
+                             ' lost, error: {}'.format(self.path, len(lines), err))
+
+    def close(self):
+        """写入剩余记录并关闭文件"""
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# (进程号, 目录) -> 记录器，fork出的子进程不会复用父进程的记录器
+_journals = {}
+
+
+def get_journal(base_dir):
+    """
+    获取当前进程中指定目录下的爬取记录器
+    :param base_dir: 记录文件所在目录
+    :return:
+    """
+    key = (os.getpid(), os.path.abspath(base_dir))
+    journal = _journals.get(key)
+    if journal is None:
+        journal = _journals[key] = CrawlJournal(key[1])
+    return journal
+
+
+def close_journals():
+    """关闭当前进程中的所有记录器"""
+    pid = os.getpid()
+    for key in [k for k in _journals if k[0] == pid]:
+        _journals.pop(key).close()
+
+
+atexit.register(close_journals)
@@ -0,0 +1,194 @@
+"""
+页面内链接解析，提供基于PyQuery的DOM解析与单次扫描的快速解析两种方式
+"""
+import html
+import itertools
+import re
+
+from loguru import logger
+from pyquery import PyQuery
+
+import common as cm
+import config as conf
+
+from resource_gate import is_not_special_type_link
+
+EXTRACTOR_PYQUERY = 'pyquery'
+EXTRACTOR_FAST = 'fast'
+
+_ATTR_VALUE = r'\s*=\s*(?:"(?P<{0}_dq>[^"]*)"|\'(?P<{0}_sq>[^\']*)\'|(?P<{0}_uq>[^\s"\'>]+))'
+_TAG_TEXT_PATTERN = (
+    r'<a\b[^>]*?\shref' + _ATTR_VALUE.format('href') +
+    r'|<i?frame\b[^>]*?\ssrc' + _ATTR_VALUE.format('src'))
+# 一次扫描同时匹配a标签的href、frame/iframe标签的src以及文本中的url
+_LINK_PATTERN = re.compile(
+    _TAG_TEXT_PATTERN + r'|' + cm.URL_TEXT_PATTERN,
+    re.IGNORECASE | re.ASCII
+)
+# 超出文本url扫描范围的部分只匹配href、src属性，与DOM解析的方式保持一致
+_TAG_PATTERN = re.compile(_TAG_TEXT_PATTERN, re.IGNORECASE | re.ASCII)
+
+
+def _is_valid_href(href):
+    if href in ['/', '*']:
+        return False
+    if href.startswith('javascript') or href.startswith('mailto'):
+        return False
+    return True
+
+
+def _is_valid_src(src):
+    if src is None or src.strip() in ["", "about:blank", "*"]:
+        return False
+    if "*" in src:
+        return False
+    return True
+
+
+def collect_links_pyquery(url, page_content, page_text):
+    """
+    构建DOM树解析a、frame、iframe标签中的链接，并正则匹配文本中的url
+    :param url: 源url
+    :param page_content: 页面内容
+    :param page_text: 解码之后的页面内容
+    :return: 未经处理的链接集合
+    """
+    links = set()
+    try:
+        dom_tree = PyQuery(page_content)
+    except Exception as err:
+        logger.warning(
+            'Parse dom tree failed! The error: %s' % err)
+        return links
+    if dom_tree is None:
+        logger.info('Get no dom tree for url: %s' % url)
+        return links
+
+    for ele in dom_tree('a'):
+        if not 'href' in ele.attrib:
+            continue
+        href = ele.attrib['href']
+        if not _is_valid_href(href):
+            continue
+        links.add(href)
+        logger.info('Get link: %s' % href)
+
+    for iframe in dom_tree('frame,iframe'):
+        if not 'src' in iframe.attrib:
+            continue
+        iframe_src = iframe.attrib['src']
+        if not _is_valid_src(iframe_src):
+            continue
+        links.add(iframe_src)
+        logger.info('Get link: %s' % iframe_src)
+    # 使用正则匹配可能未解析到的url
+    extra_urls = cm.match_url(page_text)
+    for extra_url in extra_urls:
+        links.add(extra_url)
+    return links
+
+
+def collect_links_fast(url, page_content, page_text):
+    """
+    不构建DOM树，对页面文本进行一次扫描，同时取出href、src属性与文本中的url
+    :param url: 源url
+    :param page_content: 页面内容
+    :param page_text: 解码之后的页面内容
+    :return: 未经处理的链接集合
+    """
+    links = set()
+    if not isinstance(page_text, str):
+        return links
+    text_urls = 0
+    # 文本中的url只在开头的URL_SCAN_WINDOW个字符内匹配，与match_url一致；
+    # 分界点退回到标签开头，避免跨越分界的标签被截断
+    boundary = len(page_text)
+    if boundary > conf.URL_SCAN_WINDOW:
+        boundary = page_text.rfind('<', 0, conf.URL_SCAN_WINDOW)
+        if boundary < 0:
+            boundary = conf.URL_SCAN_WINDOW
+    matches = itertools.chain(
+        _LINK_PATTERN.finditer(page_text, 0, boundary),
+        _TAG_PATTERN.finditer(page_text, boundary))
+    for match in matches:
+        groups = match.groupdict()
+        text_url = groups.get('url')
+        if text_url is not None:
+            if text_urls < conf.URL_SCAN_LIMIT and cm.accept_url_match(match):
+                text_urls += 1
+                links.add(text_url)
+            continue
+        href = groups['href_dq'] or groups['href_sq'] or groups['href_uq']
+        if href is not None:
+            if '&' in href:
+                href = html.unescape(href)
+            if _is_valid_href(href):
+                links.add(href)
+            continue
+        src = groups['src_dq'] or groups['src_sq'] or groups['src_uq']
+        if src is not None and '&' in src:
+            src = html.unescape(src)
+        if _is_valid_src(src):
+            links.add(src)
+    return links
+
+
+EXTRACTORS = {
+    EXTRACTOR_PYQUERY: collect_links_pyquery,
+    EXTRACTOR_FAST: collect_links_fast,
+}
+
+
+def filter_links(url, links, level=0):
+    """
+    补齐链接并按照爬取级别过滤
+    :param url: 源url
+    :param links: 未经处理的链接
+    :param level: 爬取级别，0：只爬三级域名相同的链接，1：只爬二级域名相同的链接，2：所有链接均爬取
+    :return:
+    """
+    if level not in (0, 1, 2):
+        raise ValueError('The column "level" must in (0, 1, 2),'
+                         ' but now is: {}'.format(level))
+    links = {cm.validate_and_fill_url(url, link) for link in links}
+    # 补齐之后再去掉不需要的后缀的链接，避免把域名当作扩展名
+    links = set(filter(is_not_special_type_link, links))
+    if level == 2:
+        return links
+    current = cm.parse_url(url)
+    if current is None:
+        return set()
+    ret = set()
+    for link in links:
+        parsed = cm.parse_url(link)
+        if parsed is None:
+            continue
+        if level == 0 and parsed.host == current.host:
+            ret.add(link)
+        elif level == 1 and parsed.sld == current.sld:
+            ret.add(link)
+    return ret
+
+
+def extract_links(url, page_content, page_text, level=0,
+                  extractor=EXTRACTOR_PYQUERY):
+    """
+    解析页面内链接
+    :param url: 源url
+    :param page_content: 页面内容
+    :param page_text: 解码之后的页面内容
+    :param level: 爬取级别
+    :param extractor: 解析方式，pyquery或fast
+    :return:
+    """
+    if not page_content:
+        return set()
+    logger.info('Extract links from page: %s' % url)
+    try:
+        collect = EXTRACTORS[extractor]
+    except KeyError:
+        logger.warning('Unknown link extractor: {}, now use "{}" '
+                       'instead'.format(extractor, EXTRACTOR_PYQUERY))
+        collect = collect_links_pyquery
+    links = collect(url, page_content, page_text)
+    return filter_links(url, links, level)
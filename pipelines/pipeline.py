@@ -17,6 +17,9 @@ from db_utils.mongo import MongoDB
 from db_utils.mongo import MongoFile
 from db_utils import db_settings as ds
 
+# Result中保存的页面校验信息字段
+VALIDATOR_FIELDS = ('etag', 'last_modified', 'links', 'redirect')
+
 
 class Pipeline(_Pipeline):
     """
@@ -29,12 +32,37 @@ class Pipeline(_Pipeline):
             "results": {
                 "http://www.example.com/a": "aaa",
                 "http://www.example.com/b": "bbb"
+            },
+            "validators": {
+                "http://www.example.com/a": {
+                    "etag": "...",
+                    "last_modified": "...",
+                    "links": ["http://www.example.com/b"],
+                    "redirect": null
+                }
             }
         }
+    validators为页面的校验信息，用于再次爬取时发送条件请求
     """
 
     __spiders__ = ['spider']
 
+    def load_validators(self, task):
+        """
+        载入上次爬取时保存的页面校验信息，由爬虫在运行前调用
+        :param task: 爬取任务
+        :return: url -> 校验信息
+        """
+        mongo_db = MongoDB(conf.MONGO_URI)
+        projection = {'url': 1}
+        projection.update((field, 1) for field in VALIDATOR_FIELDS)
+        results, _ = mongo_db.find_many(
+            coll_name=ds.RESULT_TB,
+            sfilter={'task': task},
+            projection=projection
+        )
+        return {result['url']: result for result in results}
+
     def pipe_save2mongo(self, data):
         """
         将数据存入mongo
@@ -61,15 +89,20 @@ class Pipeline(_Pipeline):
                 key=get_md5(url),
                 data=content
             )
+            result = {
+                'task': task,
+                'url': url,
+                'ref_content_id': ObjectId(file_id),
+                'update_time': datetime.now()
+            }
+            # 页面的校验信息，没有时清空原有的校验信息
+            validator = data.get('validators', {}).get(url, {})
+            for field in VALIDATOR_FIELDS:
+                result[field] = validator.get(field)
             mongo_db.update_many(
                 coll_name=ds.RESULT_TB,
                 sfilter={'task': task, 'url': url},
-                data={
-                    'task': task,
-                    'url': url,
-                    'ref_content_id': ObjectId(file_id),
-                    'update_time': datetime.now()
-                },
+                data=result,
                 upsert=True
             )
             logger.info('Save result successfully! The url: {}'.format(url))
@@ -0,0 +1,67 @@
+"""
+按host限制请求频率的调度器，只延迟发往同一host的请求而不阻塞事件循环
+"""
+import asyncio
+import time
+
+import config as conf
+
+
+class HostScheduler(object):
+    """
+    基于令牌桶（GCRA算法）的按host限速：同一host的请求间隔不小于interval，
+    允许最多burst个请求连续发出。进程内共享，多个站点爬虫访问同一host时共同受限
+    """
+
+    def __init__(self, burst=None, max_hosts=None):
+        """
+        :param burst: 允许连续发出的请求数
+        :param max_hosts: 记录的host数上限，超过时清理已过期的记录
+        """
+        self._burst = max(1, burst or conf.POLITENESS_BURST)
+        self._max_hosts = max_hosts or conf.POLITENESS_MAX_HOSTS
+        # host -> 理论上下一个请求的到达时间
+        self._tat = {}
+
+    def _prune(self, now):
+        for host in [h for h, tat in self._tat.items() if tat <= now]:
+            del self._tat[host]
+
+    def reserve(self, host, interval):
+        """
+        为host预约一次请求
+        :param host: 请求的host
+        :param interval: 同一host请求的最小间隔(单位：秒)
+        :return: 需要等待的时间(单位：秒)
+        """
+        if not interval or interval <= 0:
+            return 0
+        now = time.monotonic()
+        if host not in self._tat and len(self._tat) >= self._max_hosts:
+            self._prune(now)
+        tat = max(self._tat.get(host, now), now)
+        delay = tat - (self._burst - 1) * interval - now
+        self._tat[host] = tat + interval
+        return max(0, delay)
+
+    async def wait(self, host, interval):
+        """
+        等待直到可以向host发出请求
+        :param host: 请求的host
+        :param interval: 同一host请求的最小间隔(单位：秒)
+        :return:
+        """
+        delay = self.reserve(host, interval)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+_scheduler = None
+
+
+def get_host_scheduler():
+    """获取进程内共享的调度器"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = HostScheduler()
+    return _scheduler
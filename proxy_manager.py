@@ -0,0 +1,285 @@
+"""
+进程内的代理IP管理，缓存代理池中的代理并按照成功率与延迟选择代理
+"""
+import asyncio
+import bisect
+import itertools
+import json
+import random
+import time
+
+import aiohttp
+
+from aiohttp import ClientTimeout
+from loguru import logger
+
+import common as cm
+import config as conf
+
+from http_session import session_manager
+
+
+async def get_proxy():
+    """获取一个代理IP"""
+    async with aiohttp.request('GET', conf.GET_ONE_PROXY_IP_URL) as resp:
+        return await resp.read()
+
+
+async def get_all_proxies():
+    """获取所有代理IP"""
+    async with aiohttp.request('GET', conf.GET_ALL_PROXY_IPS_URL) as resp:
+        resp_data = await resp.read()
+        all_proxies = json.loads(resp_data)
+        return all_proxies
+
+
+async def delete_proxy(proxy):
+    """从代理池中删除代理IP"""
+    async with aiohttp.request('GET', conf.DELETE_PROXY_IP_URL,
+                               params={'proxy': proxy}) as resp:
+        return await resp.read()
+
+
+def normalize_proxy(entry):
+    """
+    统一代理池返回的代理格式
+    :param entry: 代理，如'1.2.3.4:80'、'http://1.2.3.4:80'或{'proxy': '1.2.3.4:80', ...}
+    :return: (代理url, 代理池中的原始代理)，无法识别时返回(None, None)
+    """
+    if isinstance(entry, dict):
+        entry = entry.get('proxy')
+    if isinstance(entry, bytes):
+        entry = entry.decode('utf-8', 'ignore')
+    if not isinstance(entry, str) or not entry.strip():
+        return None, None
+    raw = entry.strip()
+    if '://' in raw:
+        return raw, raw.split('://', 1)[1]
+    return 'http://' + raw, raw
+
+
+class ProxyState(object):
+    """单个代理的健康状态"""
+    __slots__ = ('proxy', 'raw', 'success', 'latency', 'failures',
+                 'quarantined_until', 'uses')
+
+    def __init__(self, proxy, raw):
+        """
+        :param proxy: 代理url
+        :param raw: 代理池中的原始代理，删除代理时使用
+        """
+        self.proxy = proxy
+        self.raw = raw
+        # 成功率与延迟(单位：秒)的指数加权移动平均
+        self.success = 1.0
+        self.latency = None
+        # 连续失败次数
+        self.failures = 0
+        self.quarantined_until = 0.0
+        self.uses = 0
+
+    @property
+    def weight(self):
+        """被选中的权重，成功率越高、延迟越低权重越大"""
+        latency = conf.PROXY_DEFAULT_LATENCY if self.latency is None \
+            else self.latency
+        return self.success / (latency + 0.1)
+
+
+class _LoopProxies(object):
+    """一个事件循环中各代理的会话与刷新任务"""
+
+    def __init__(self):
+        self.sessions = {}
+        self.refresh_task = None
+
+
+class ProxyManager(object):
+    """
+    定期从代理池刷新代理列表，按权重随机选择代理，连续失败的代理暂时隔离，
+    成功率过低的代理从代理池中删除；每个代理使用独立的连接池
+    代理的评分在进程内共享，会话与刷新任务按事件循环分别保存
+    """
+
+    def __init__(self, refresh_interval=None, alpha=None):
+        """
+        :param refresh_interval: 刷新代理列表的间隔(单位：秒)
+        :param alpha: 指数加权移动平均中新观测值的权重
+        """
+        self._refresh_interval = refresh_interval or conf.PROXY_REFRESH_INTERVAL
+        self._alpha = alpha or conf.PROXY_EWMA_ALPHA
+        self._proxies = {}
+        self._loop_proxies = cm.LoopLocal(_LoopProxies)
+        self._refreshed_at = 0.0
+        self.evicted = 0
+
+    @property
+    def size(self):
+        """当前可用的代理数"""
+        return len(self._proxies)
+
+    def stats(self):
+        """各代理的状态统计"""
+        now = time.time()
+        return {
+            'proxies': len(self._proxies),
+            'quarantined': sum(1 for s in self._proxies.values()
+                               if s.quarantined_until > now),
+            'evicted': self.evicted,
+        }
+
+    async def refresh(self, force=False):
+        """
+        刷新代理列表，列表为空时等待刷新完成，否则只在后台刷新
+        :param force: 是否忽略刷新间隔立即刷新
+        :return:
+        """
+        local = self._loop_proxies.get()
+        expired = time.time() - self._refreshed_at >= self._refresh_interval
+        if (force or expired) and local.refresh_task is None:
+            local.refresh_task = asyncio.ensure_future(self._refresh(local))
+        if local.refresh_task is not None and (force or not self._proxies):
+            await asyncio.shield(local.refresh_task)
+
+    async def _refresh(self, local):
+        try:
+            entries = await get_all_proxies()
+        except Exception as err:
+            logger.warning('Refresh proxies failed, error: {}'.format(err))
+            return
+        finally:
+            self._refreshed_at = time.time()
+            local.refresh_task = None
+        latest = {}
+        for entry in entries or ():
+            proxy, raw = normalize_proxy(entry)
+            if proxy is not None:
+                latest[proxy] = self._proxies.get(proxy) or ProxyState(
+                    proxy, raw)
+        for proxy in set(self._proxies) - set(latest):
+            self._drop_session(proxy)
+        self._proxies = latest
+        logger.info('Refresh proxies finished, proxies: {}'.format(
+            len(latest)))
+
+    def choose(self, exclude=()):
+        """
+        按权重随机选择一个未被隔离的代理
+        :param exclude: 不选择的代理
+        :return: 代理url，没有可用代理时返回None
+        """
+        now = time.time()
+        candidates = [s for p, s in self._proxies.items()
+                      if p not in exclude and s.quarantined_until <= now]
+        if not candidates:
+            return None
+        cumulative = list(itertools.accumulate(s.weight for s in candidates))
+        idx = bisect.bisect(cumulative, random.random() * cumulative[-1])
+        state = candidates[min(idx, len(candidates) - 1)]
+        state.uses += 1
+        return state.proxy
+
+    def report(self, proxy, ok, latency=None):
+        """
+        记录一次使用代理的请求结果
+        :param proxy: 代理url
+        :param ok: 请求是否成功
+        :param latency: 请求耗时(单位：秒)
+        :return:
+        """
+        state = self._proxies.get(proxy)
+        if state is None:
+            return
+        alpha = self._alpha
+        state.success = alpha * (1.0 if ok else 0.0) + (1 - alpha) * state.success
+        if ok:
+            state.failures = 0
+            if latency is not None:
+                state.latency = latency if state.latency is None else \
+                    alpha * latency + (1 - alpha) * state.latency
+            return
+        state.failures += 1
+        if state.success < conf.PROXY_EVICT_SCORE:
+            self.evict(proxy)
+        elif state.failures >= conf.PROXY_MAX_FAILURES:
+            state.quarantined_until = time.time() + conf.PROXY_QUARANTINE_TIME
+            state.failures = 0
+            logger.info('Quarantine proxy {} for {}s, success rate: '
+                        '{:.2f}'.format(proxy, conf.PROXY_QUARANTINE_TIME,
+                                        state.success))
+
+    def evict(self, proxy):
+        """
+        移除代理并在后台从代理池中删除
+        :param proxy: 代理url
+        :return:
+        """
+        state = self._proxies.pop(proxy, None)
+        if state is None:
+            return
+        self.evicted += 1
+        self._drop_session(proxy)
+        logger.info('Evict proxy {}, success rate: {:.2f}'.format(
+            proxy, state.success))
+        asyncio.ensure_future(self._delete(state.raw))
+
+    @staticmethod
+    async def _delete(raw):
+        try:
+            await delete_proxy(raw)
+        except Exception as err:
+            logger.warning('Delete proxy {} from the pool failed, '
+                           'error: {}'.format(raw, err))
+
+    def get_session(self, proxy):
+        """
+        获取代理专用的会话，每个代理的连接单独复用
+        :param proxy: 代理url
+        :return:
+        """
+        sessions = self._loop_proxies.get().sessions
+        session = sessions.get(proxy)
+        if session is None or session.closed:
+            session = sessions[proxy] = aiohttp.ClientSession(
+                connector=session_manager.create_connector(
+                    limit=conf.PROXY_CONNECTOR_LIMIT,
+                    limit_per_host=conf.PROXY_CONNECTOR_LIMIT),
+                timeout=ClientTimeout(total=conf.CRAWL_TIMEOUT)
+            )
+        return session
+
+    def _drop_session(self, proxy):
+        # 只关闭当前事件循环中的会话，其他事件循环的会话在其关闭时释放
+        local = self._loop_proxies.peek()
+        session = local.sessions.pop(proxy, None) if local else None
+        if session is not None and not session.closed:
+            asyncio.ensure_future(session.close())
+
+    async def close(self):
+        """关闭当前事件循环中所有代理的会话"""
+        local = self._loop_proxies.pop()
+        if local is None:
+            return
+        if local.refresh_task is not None:
+            local.refresh_task.cancel()
+            await asyncio.gather(local.refresh_task, return_exceptions=True)
+        for session in local.sessions.values():
+            if not session.closed:
+                await session.close()
+
+
+_manager = None
+
+
+def get_proxy_manager():
+    """获取进程内共享的代理管理器"""
+    global _manager
+    if _manager is None:
+        _manager = ProxyManager()
+    return _manager
+
+
+async def close_proxy_manager():
+    """关闭当前事件循环中代理管理器的会话"""
+    if _manager is not None:
+        await _manager.close()
@@ -2,8 +2,7 @@
 IP代理池使用前置
 """
 
-import aiohttp
-import json
+import time
 
 from aiohttp import ClientTimeout
 from loguru import logger
@@ -11,33 +10,132 @@ from loguru import logger
 import common as cm
 import config as conf
 
-from url_redirect import redirect
+from cpu_pool import decode_content
+from exceptions import ProxyUnavailableError
+from http_session import get_session
+from proxy_manager import delete_proxy
+from proxy_manager import get_all_proxies
+from proxy_manager import get_proxy
+from proxy_manager import get_proxy_manager
+from resource_gate import reject_response
+from url_redirect import detect_redirect
 
 
-async def get_proxy():
-    """获取一个代理IP"""
-    async with aiohttp.request('GET', conf.GET_ONE_PROXY_IP_URL) as resp:
-        return await resp.read()
+class FetchResult(object):
+    """
+    请求结果，可以像(content, page_text)元组一样解包
+    """
+    __slots__ = ('content', 'page_text', 'status', 'headers', 'truncated',
+                 'aborted', 'redirect_url')
+
+    def __init__(self, content=b'', page_text='', status=None, headers=None,
+                 truncated=False, aborted=False, redirect_url=None):
+        """
+        :param content: 页面内容
+        :param page_text: 解码之后的页面内容
+        :param status: 响应状态码
+        :param headers: 响应头
+        :param truncated: 是否因超过大小限制而只读取了部分内容
+        :param aborted: 是否被中止读取（响应头不符合要求或on_chunk要求中止）
+        :param redirect_url: 页面中解析到的重定向url
+        """
+        self.content = content
+        self.page_text = page_text
+        self.status = status
+        self.headers = headers
+        self.truncated = truncated
+        self.aborted = aborted
+        self.redirect_url = redirect_url
+
+    @property
+    def not_modified(self):
+        """条件请求的页面是否未修改"""
+        return self.status == 304
 
+    def __iter__(self):
+        yield self.content
+        yield self.page_text
 
-async def get_all_proxies():
-    """获取所有代理IP"""
-    async with aiohttp.request('GET', conf.GET_ALL_PROXY_IPS_URL) as resp:
-        resp_data = await resp.read()
-        all_proxies = json.loads(resp_data)
-        return all_proxies
 
+class ByteBudget(object):
+    """
+    一个站点允许下载的总字节数，同一站点的所有请求共享
+    """
+
+    def __init__(self, limit=None):
+        """
+        :param limit: 字节数上限，为0则不限制
+        """
+        self.limit = conf.SITE_BYTE_BUDGET if limit is None else limit
+        self.used = 0
 
-async def delete_proxy(proxy):
-    """从代理池中删除代理IP"""
-    async with aiohttp.request('GET', conf.DELETE_PROXY_IP_URL,
-                               params={'proxy': proxy}) as resp:
-        return resp.read()
+    @property
+    def remaining(self):
+        """剩余可下载的字节数，不限制时为None"""
+        if not self.limit:
+            return None
+        return max(self.limit - self.used, 0)
+
+    @property
+    def exhausted(self):
+        """是否已用完"""
+        return self.remaining == 0
+
+    def consume(self, size):
+        """记录已下载的字节数"""
+        self.used += size
+
+
+async def read_body(resp, max_bytes=None, budget=None, on_chunk=None):
+    """
+    分块读取响应内容
+    :param resp: aiohttp的响应
+    :param max_bytes: 单个页面读取的字节数上限，为0则不限制
+    :param budget: 站点的字节数预算ByteBudget
+    :param on_chunk: 每读取一块调用on_chunk(chunk, at_eof)，读取结束时以空块与
+        at_eof=True再调用一次，返回真值则中止读取
+    :return: (内容, 是否被截断, 是否被中止)
+    """
+    limit = conf.MAX_PAGE_BYTES if max_bytes is None else max_bytes
+    if budget is not None and budget.exhausted:
+        # 预算在等待请求期间已被其他请求用完，不再读取内容
+        resp.close()
+        return b'', True, False
+    chunks = []
+    received = 0
+    truncated = aborted = False
+    async for chunk in resp.content.iter_chunked(conf.READ_CHUNK_SIZE):
+        allowed = limit - received if limit else None
+        if budget is not None and budget.remaining is not None:
+            # 同一站点并发读取的页面共享预算，每读取一块即扣除
+            allowed = budget.remaining if allowed is None else min(
+                allowed, budget.remaining)
+        if allowed is not None and len(chunk) > allowed:
+            chunk = chunk[:allowed]
+            truncated = True
+        chunks.append(chunk)
+        received += len(chunk)
+        if budget is not None:
+            budget.consume(len(chunk))
+        if on_chunk is not None and on_chunk(chunk, False):
+            aborted = True
+            break
+        if truncated:
+            break
+    else:
+        if on_chunk is not None and on_chunk(b'', True):
+            aborted = True
+    if truncated or aborted:
+        # 丢弃剩余内容，不再复用该连接
+        resp.close()
+    return b''.join(chunks), truncated, aborted
 
 
 async def aio_request(method, url, params=None, json=None,
                       headers=None, proxy_ip=None,
-                      parse_redirect_url=True, timeout=5 * 60):
+                      parse_redirect_url=True, timeout=5 * 60,
+                      max_bytes=None, budget=None, on_chunk=None,
+                      session=None):
     """
     异步请求并获取返回结果
     :param method: HTTP标准方法
@@ -46,30 +144,49 @@ async def aio_request(method, url, params=None, json=None,
     :param json: 请求json数据
     :param headers: 请求头
     :param proxy_ip: 代理ip
-    :param parse_redirect_url: 是否解析重定向的url
+    :param parse_redirect_url: 是否解析页面内的跳转url，结果见FetchResult.redirect_url
     :param timeout: 请求超时时间(单位：秒)
-    :return:
+    :param max_bytes: 单个页面读取的字节数上限，默认读取配置
+    :param budget: 站点的字节数预算ByteBudget
+    :param on_chunk: 分块读取时的回调，返回真值则中止读取，见read_body
+    :param session: 使用的会话，默认为进程内共享的会话
+    :return: FetchResult
     """
     timeout_obj = ClientTimeout(total=timeout)
-    async with aiohttp.ClientSession(timeout=timeout_obj) as session:
-        async with getattr(session, method.lower())(
-                url, timeout=timeout_obj, params=params, json=json,
-                headers=headers, proxy=proxy_ip, verify_ssl=False) as resp:
-            content = await resp.read()
-            page_text = cm.guess_and_decode(content)
-            if parse_redirect_url:
-                redirect_resp = await redirect(url, page_text, headers=headers)
-                if redirect_resp:
-                    content = await redirect_resp.read()
-                    page_text = cm.guess_and_decode(content)
-            return content, page_text
+    session = session or get_session()
+    async with getattr(session, method.lower())(
+            url, timeout=timeout_obj, params=params, json=json,
+            headers=headers, proxy=proxy_ip) as resp:
+        result = FetchResult(status=resp.status, headers=resp.headers)
+        if result.not_modified:
+            # 条件请求命中，没有响应内容
+            return result
+        if reject_response(url, resp):
+            result.aborted = True
+            return result
+        content, result.truncated, result.aborted = await read_body(
+            resp, max_bytes, budget, on_chunk)
+        content_type = resp.headers.get('Content-Type')
+    result.content = content
+    if result.truncated:
+        logger.warning('The page is too large, only the first {} bytes are '
+                       'kept, url: {}'.format(len(content), url))
+    if result.aborted:
+        return result
+    result.page_text = await decode_content(
+        content, content_type, cm.get_host_from_url(url))
+    if parse_redirect_url:
+        # 只解析跳转目标，由调用方按照正常流程去重并下载
+        result.redirect_url = detect_redirect(url, result.page_text)
+    return result
 
 
 async def request_with_proxy(method, url, params=None, json=None,
                              headers=None, parse_redirect_url=True,
-                             timeout=5 * 60):
+                             timeout=5 * 60, max_bytes=None, budget=None,
+                             on_chunk=None):
     """
-    尝试使用代理池请求目标
+    尝试使用代理池请求目标，每次选择一个不同的代理，最多尝试PROXY_TRIED_TIMES个代理
     :param method: 标准http请求方法
     :param url: 请求url
     :param params: 请求参数
@@ -77,27 +194,55 @@ async def request_with_proxy(method, url, params=None, json=None,
     :param headers: 请求头
     :param parse_redirect_url: 是否解析重定向url
     :param timeout: 请求超时时间
-    :return:
+    :param max_bytes: 单个页面读取的字节数上限
+    :param budget: 站点的字节数预算ByteBudget
+    :param on_chunk: 分块读取时的回调，带有reset方法时每次请求前调用
+    :return: FetchResult
+    :raise ProxyUnavailableError: 没有可用的代理或尝试的代理均请求失败
     """
-    all_proxy_ips = await get_all_proxies()
-    loop_count = 0
-    for proxy_ip in all_proxy_ips:
-        if loop_count > conf.PROXY_TRIED_TIMES:
-            return '', ''
-        for i in range(conf.RETRY_TIMES):
-            try:
-                return await aio_request(
-                    method=method,
-                    url=url,
-                    params=params,
-                    json=json,
-                    headers=headers,
-                    proxy_ip=proxy_ip,
-                    parse_redirect_url=parse_redirect_url,
-                    timeout=timeout
-                )
-            except Exception as err:
-                logger.warning('Download page content failed, now retry'
-                               'url: {}, proxy: {}, error: {}'.format(url, proxy_ip, err))
-                continue
-        loop_count += 1
\ No newline at end of file
+    manager = get_proxy_manager()
+    await manager.refresh()
+    tried = set()
+    last_error = None
+    for _ in range(conf.PROXY_TRIED_TIMES):
+        proxy_ip = manager.choose(exclude=tried)
+        if proxy_ip is None:
+            break
+        tried.add(proxy_ip)
+        if hasattr(on_chunk, 'reset'):
+            on_chunk.reset()
+        start = time.time()
+        try:
+            result = await aio_request(
+                method=method,
+                url=url,
+                params=params,
+                json=json,
+                headers=headers,
+                proxy_ip=proxy_ip,
+                parse_redirect_url=parse_redirect_url,
+                timeout=timeout,
+                max_bytes=max_bytes,
+                budget=budget,
+                on_chunk=on_chunk,
+                session=manager.get_session(proxy_ip)
+            )
+        except Exception as err:
+            last_error = err
+            manager.report(proxy_ip, False)
+            logger.warning('Download page content failed, now retry'
+                           'url: {}, proxy: {}, error: {}'.format(url, proxy_ip, err))
+            continue
+        if result.status in conf.PROXY_FAILURE_STATUS:
+            # 代理需要认证或代理无法连接上游，视为代理不可用，换下一个代理重试
+            last_error = 'proxy response status: {}'.format(result.status)
+            manager.report(proxy_ip, False)
+            continue
+        manager.report(proxy_ip, True, time.time() - start)
+        return result
+    if not tried:
+        raise ProxyUnavailableError(
+            'No proxy is available, url: {}'.format(url))
+    raise ProxyUnavailableError(
+        'All {} proxies tried failed, url: {}, last error: {}'.format(
+            len(tried), url, last_error))
@@ -0,0 +1,169 @@
+"""
+公共后缀(Public Suffix List)查询，用于从域名中取出可注册的二级域名
+"""
+import functools
+
+from loguru import logger
+
+import config as conf
+import constansts as cons
+
+# 节点中表示该后缀本身是一条规则的键，域名的各段均不为空，因此不会冲突
+_TERMINAL = ''
+_WILDCARD = '*'
+_EXCEPTION = '!'
+_PRIVATE_BEGIN = '// ===BEGIN PRIVATE DOMAINS==='
+
+
+class PublicSuffixTrie(object):
+    """
+    按照域名从右到左的各段构建的后缀树，查询时间与域名的段数成正比
+    支持公共后缀列表中的通配规则(*.ck)与例外规则(!www.ck)，未命中任何规则时按照
+    默认规则把最后一段视为公共后缀
+    """
+
+    def __init__(self, rules=()):
+        """
+        :param rules: 后缀规则，如com.cn、*.ck、!www.ck，开头的.会被忽略
+        """
+        self._root = {}
+        self.size = 0
+        for rule in rules:
+            self.add(rule)
+
+    def add(self, rule):
+        """
+        添加一条后缀规则，非ASCII的规则同时添加其punycode形式
+        :param rule: 后缀规则
+        :return:
+        """
+        rule = rule.strip().strip('.').lower()
+        if not rule:
+            return
+        self._add(rule)
+        try:
+            ascii_rule = rule.encode('idna').decode('ascii')
+        except UnicodeError:
+            return
+        if ascii_rule != rule:
+            self._add(ascii_rule)
+
+    def _add(self, rule):
+        labels = rule.split('.')
+        node = self._root
+        for label in reversed(labels[1:]):
+            node = node.setdefault(label, {})
+        # 例外与通配规则只会出现在最左侧的一段
+        node.setdefault(labels[0], {})[_TERMINAL] = True
+        self.size += 1
+
+    @classmethod
+    def load(cls, path, include_private=False):
+        """
+        从公共后缀列表文件中加载规则
+        :param path: public_suffix_list.dat的路径
+        :param include_private: 是否包含私有域名部分(如github.io)
+        :return:
+        """
+        trie = cls()
+        with open(path, 'r', encoding='utf-8') as fr:
+            for line in fr:
+                if line.startswith(_PRIVATE_BEGIN) and not include_private:
+                    break
+                line = line.strip()
+                if not line or line.startswith('//'):
+                    continue
+                # 每行只取第一个空白字符之前的部分
+                trie.add(line.split()[0])
+        return trie
+
+    def is_tld(self, label):
+        """
+        是否为已知的顶级域名
+        :param label: 小写的域名最后一段
+        :return:
+        """
+        return label in self._root
+
+    def suffix_labels(self, labels):
+        """
+        计算公共后缀的段数
+        :param labels: 从右到左排列的域名各段
+        :return:
+        """
+        node = self._root
+        matched = 1
+        for idx, label in enumerate(labels):
+            if _EXCEPTION + label in node:
+                # 例外规则：该段不属于公共后缀
+                return idx
+            if _WILDCARD in node:
+                matched = idx + 1
+            node = node.get(label)
+            if node is None:
+                break
+            if _TERMINAL in node:
+                matched = idx + 1
+        return matched
+
+    def get_public_suffix(self, host):
+        """
+        获取域名的公共后缀，如www.test.com.cn返回com.cn
+        :param host: 不含端口的域名
+        :return:
+        """
+        labels = host.strip('.').lower().split('.')
+        count = self.suffix_labels(labels[::-1])
+        return '.'.join(labels[-count:])
+
+    def get_sld(self, host):
+        """
+        获取可注册的二级域名，如www.test.com.cn返回test.com.cn，域名本身即为公共后缀时原样返回
+        :param host: 不含端口的域名
+        :return:
+        """
+        labels = host.strip('.').lower().split('.')
+        count = self.suffix_labels(labels[::-1])
+        if len(labels) <= count:
+            return host
+        return '.'.join(labels[-count - 1:])
+
+
+_trie = None
+
+
+def get_public_suffix_trie():
+    """
+    获取进程内共享的后缀树，数据文件不可用时使用内置的IGNORED_SLD_LIST
+    """
+    global _trie
+    if _trie is None:
+        try:
+            _trie = PublicSuffixTrie.load(
+                conf.PUBLIC_SUFFIX_DATA_PATH, conf.PUBLIC_SUFFIX_PRIVATE)
+        except OSError as err:
+            logger.warning('Load public suffix list from "{}" failed, now use '
+                           'the default list, error: {}'.format(
+                               conf.PUBLIC_SUFFIX_DATA_PATH, err))
+            _trie = PublicSuffixTrie(cons.IGNORED_SLD_LIST)
+    return _trie
+
+
+@functools.lru_cache(maxsize=conf.SLD_CACHE_SIZE)
+def get_sld(host):
+    """
+    获取域名的二级域名，按域名缓存结果
+    :param host: 不含端口的域名
+    :return:
+    """
+    return get_public_suffix_trie().get_sld(host)
+
+
+@functools.lru_cache(maxsize=conf.SLD_CACHE_SIZE)
+def get_public_suffix(host):
+    """
+    获取域名的公共后缀，按域名缓存结果
+    :param host: 不含端口的域名
+    :return:
+    """
+    return get_public_suffix_trie().get_public_suffix(host)
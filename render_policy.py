@@ -0,0 +1,150 @@
+"""
+splash渲染策略，先直接下载页面，只有需要执行脚本才能得到内容的页面才交由splash渲染
+"""
+import re
+
+from loguru import logger
+
+import config as conf
+import constansts as cons
+
+from ahocorasick import get_automaton
+
+RENDER_ALWAYS = 'always'
+RENDER_HYBRID = 'hybrid'
+
+# 内容为空的单页应用根节点
+SPA_ROOT_PATTERN = re.compile(
+    r'<div\b[^>]*?\bid\s*=\s*["\']?(?:app|root|__next|__nuxt|main-app)\b'
+    r'[^>]*>\s*</div>'
+    r'|<app-root\b[^>]*>\s*</app-root>'
+    r'|<body\b[^>]*\bng-app\b',
+    re.IGNORECASE
+)
+# noscript标签中要求开启脚本的提示
+NOSCRIPT_PATTERN = re.compile(
+    r'<noscript\b[^>]*>[^<]{0,200}?'
+    r'(?:enable|requires?|need|turn on|开启|启用|打开|支持|需要)[^<]{0,40}?'
+    r'(?:javascript|js|脚本)',
+    re.IGNORECASE
+)
+INVISIBLE_PATTERN = re.compile(
+    r'<(script|style|template|noscript)\b.*?</\1\s*>|<!--.*?-->',
+    re.IGNORECASE | re.S
+)
+TAG_PATTERN = re.compile(r'<[^>]*>')
+
+
+def visible_text(page_text):
+    """
+    粗略获取body中可见文本，用于判断页面内容是否由脚本生成
+    :param page_text: 解码之后的页面内容
+    :return:
+    """
+    head = page_text[:conf.RENDER_SCAN_WINDOW]
+    start = head.lower().find('<body')
+    body = head[start:] if start >= 0 else head
+    body = INVISIBLE_PATTERN.sub(' ', body)
+    return ' '.join(TAG_PATTERN.sub(' ', body).split())
+
+
+def needs_render(result, feature=None):
+    """
+    判断直接下载的页面是否需要交由splash渲染
+    :param result: 直接下载的结果FetchResult
+    :param feature: 读取时已匹配到的无用页面特征
+    :return: 需要渲染的原因，不需要时返回None
+    """
+    if feature in cons.RENDER_PAGE_FEATURE:
+        return 'loading feature'
+    if result.aborted or result.truncated:
+        return None
+    page_text = result.page_text
+    if not page_text or not isinstance(page_text, str):
+        return None
+    if SPA_ROOT_PATTERN.search(page_text, 0, conf.RENDER_SCAN_WINDOW):
+        return 'spa root'
+    if '<script' not in page_text and '<SCRIPT' not in page_text:
+        # 没有脚本的页面渲染前后内容一致
+        return None
+    text = visible_text(page_text)
+    if len(text) < conf.RENDER_MIN_TEXT_LENGTH:
+        return 'empty body'
+    if len(text) < 1000 and get_automaton(
+            cons.RENDER_PAGE_FEATURE, 'render').contains(text):
+        return 'loading feature'
+    if NOSCRIPT_PATTERN.search(page_text, 0, conf.RENDER_SCAN_WINDOW):
+        return 'noscript warning'
+    return None
+
+
+class RenderDecisions(object):
+    """
+    按host记录是否需要渲染的判定结果，某个host的页面几乎都需要渲染时直接渲染，省去一次直接下载
+    """
+
+    def __init__(self, max_hosts=None):
+        """
+        :param max_hosts: 记录的host数上限
+        """
+        self._max_hosts = max_hosts or conf.RENDER_DECISION_HOSTS
+        # host -> [直接下载的页面数, 需要渲染的页面数, {原因: 次数}]
+        self._hosts = {}
+
+    def record(self, host, reason):
+        """
+        记录一次判定结果
+        :param host: 页面所属host
+        :param reason: 需要渲染的原因，不需要渲染时为None
+        :return:
+        """
+        stat = self._hosts.get(host)
+        if stat is None:
+            if len(self._hosts) >= self._max_hosts:
+                self._hosts.pop(next(iter(self._hosts)))
+            stat = self._hosts[host] = [0, 0, {}]
+        if reason is None:
+            stat[0] += 1
+            return
+        stat[1] += 1
+        stat[2][reason] = stat[2].get(reason, 0) + 1
+        logger.info('Page of host {} needs rendering, reason: {}, '
+                    'static: {}, rendered: {}'.format(host, reason, *stat[:2]))
+
+    def prefer_render(self, host):
+        """
+        该host的页面是否应当跳过直接下载，直接交由splash渲染
+        :param host: 页面所属host
+        :return:
+        """
+        stat = self._hosts.get(host)
+        if stat is None:
+            return False
+        total = stat[0] + stat[1]
+        return (total >= conf.RENDER_HOST_MIN_PAGES and
+                stat[1] >= total * conf.RENDER_HOST_RATIO)
+
+    def stats(self, host=None):
+        """
+        判定统计
+        :param host: 指定host时只返回该host的统计
+        :return:
+        """
+        if host is not None:
+            stat = self._hosts.get(host, [0, 0, {}])
+            return {'static': stat[0], 'render': stat[1],
+                    'reasons': dict(stat[2])}
+        return {'hosts': len(self._hosts),
+                'static': sum(s[0] for s in self._hosts.values()),
+                'render': sum(s[1] for s in self._hosts.values())}
+
+
+_decisions = None
+
+
+def get_render_decisions():
+    """获取进程内共享的渲染判定记录"""
+    global _decisions
+    if _decisions is None:
+        _decisions = RenderDecisions()
+    return _decisions
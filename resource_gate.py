@@ -0,0 +1,84 @@
+"""
+资源类型过滤，下载前按照链接路径的扩展名过滤，收到响应头后按照类型与长度过滤
+"""
+from loguru import logger
+
+import common as cm
+import config as conf
+import constansts as cons
+
+IGNORED_EXTENSIONS = frozenset(cons.IGNORED_EXTENSIONS)
+# 过滤统计：links为按扩展名过滤的链接数，responses为按响应头中止的响应数
+GATE_STATS = {'links': 0, 'responses': 0}
+
+
+def get_path_extension(link):
+    """
+    获取链接路径最后一段的小写扩展名，不受查询参数、锚点与域名的影响
+    :param link: 链接
+    :return: 扩展名，没有扩展名时返回空字符串
+    """
+    parsed = cm.parse_url(link)
+    if parsed is None:
+        return ''
+    segment = parsed.path.rsplit('/', 1)[-1]
+    dot = segment.rfind('.')
+    if dot < 0:
+        return ''
+    return segment[dot + 1:].lower()
+
+
+def is_not_special_type_link(link):
+    """
+    该链接是否不指向特定后缀名的资源
+    :param link
+    :type link: str
+    """
+    if link.endswith('download/app'):
+        return True
+    link_extension = get_path_extension(link)
+    if link_extension not in IGNORED_EXTENSIONS:
+        return True
+    GATE_STATS['links'] += 1
+    logger.debug(
+        'Ignored url: {}, its type: {}'.format(link, link_extension))
+    return False
+
+
+def check_response_headers(headers):
+    """
+    按照响应头判断是否需要读取响应内容
+    :param headers: 响应头
+    :return: 不需要读取时返回原因，否则返回None
+    """
+    content_type = headers.get('Content-Type')
+    if content_type and conf.ALLOWED_CONTENT_TYPES:
+        mime = content_type.split(';', 1)[0].strip().lower()
+        if mime and mime not in conf.ALLOWED_CONTENT_TYPES:
+            return 'content type: {}'.format(mime)
+    content_length = headers.get('Content-Length')
+    if content_length and conf.MAX_CONTENT_LENGTH:
+        try:
+            length = int(content_length)
+        except ValueError:
+            return None
+        if length > conf.MAX_CONTENT_LENGTH:
+            return 'content length: {}'.format(length)
+    return None
+
+
+def reject_response(url, resp):
+    """
+    检查响应头，不需要的响应直接关闭连接而不读取内容
+    :param url: 请求url
+    :param resp: aiohttp的响应
+    :return: 是否已中止该响应
+    """
+    reason = check_response_headers(resp.headers)
+    if reason is None:
+        return False
+    GATE_STATS['responses'] += 1
+    logger.info('Abort response without reading the body, url: {}, '
+                '{}'.format(url, reason))
+    resp.close()
+    return True
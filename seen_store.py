@@ -0,0 +1,154 @@
+"""
+已爬取url的去重存储
+"""
+import hashlib
+import math
+
+from loguru import logger
+
+import config as conf
+
+
+def fingerprint(url):
+    """
+    计算url的64位指纹
+    :param url: 标准化之后的url
+    :type url: str
+    :return: 64位整数
+    """
+    if isinstance(url, str):
+        url = url.encode('utf-8')
+    return int.from_bytes(
+        hashlib.blake2b(url, digest_size=8).digest(), 'big')
+
+
+class SeenUrlStore(object):
+    """
+    基于哈希表的去重存储，只保存定长的64位指纹与url出现时的最浅深度而不保存url原文
+    """
+
+    def __init__(self):
+        # 指纹 -> 最浅深度
+        self._fingerprints = {}
+        self.hits = 0
+        self.misses = 0
+        self.revisits = 0
+
+    def _contains(self, fp):
+        return fp in self._fingerprints
+
+    def _add(self, fp, depth=None):
+        self._fingerprints[fp] = depth
+
+    def _depth(self, fp):
+        return self._fingerprints.get(fp)
+
+    def __contains__(self, url):
+        return self._contains(fingerprint(url))
+
+    def __len__(self):
+        return self.misses
+
+    def add(self, url, depth=None):
+        """
+        检查并记录url
+        :param url: 标准化之后的url
+        :param depth: url所处深度
+        :return: url此前未出现过，或本次出现的深度比之前更浅时返回True，否则返回False
+        """
+        fp = fingerprint(url)
+        if self._contains(fp):
+            known = self._depth(fp)
+            if depth is None or known is None or depth >= known:
+                self.hits += 1
+                return False
+            # 以更浅的深度再次出现，需要按照新的深度重新爬取
+            self._add(fp, depth)
+            self.revisits += 1
+            return True
+        self._add(fp, depth)
+        self.misses += 1
+        return True
+
+    def min_depth(self, url):
+        """
+        url出现过的最浅深度
+        :param url: 标准化之后的url
+        :return: 未出现过或未记录深度时返回None
+        """
+        fp = fingerprint(url)
+        return self._depth(fp) if self._contains(fp) else None
+
+    def stats(self):
+        """命中统计"""
+        return {'size': len(self), 'hits': self.hits, 'misses': self.misses,
+                'revisits': self.revisits}
+
+
+class BloomSeenUrlStore(SeenUrlStore):
+    """
+    基于布隆过滤器的去重存储，内存占用固定，但存在一定的误判率（误判为已爬取），
+    且不记录深度，url之后以更浅的深度出现时不会重新爬取
+    """
+
+    def __init__(self, capacity=None, error_rate=None):
+        """
+        :param capacity: 预计存储的url数量
+        :param error_rate: 期望的误判率
+        """
+        super(BloomSeenUrlStore, self).__init__()
+        capacity = capacity or conf.BLOOM_CAPACITY
+        error_rate = error_rate or conf.BLOOM_ERROR_RATE
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError('Invalid bloom filter arguments, capacity: {}, '
+                             'error rate: {}'.format(capacity, error_rate))
+        self._bits_num = int(
+            -capacity * math.log(error_rate) / (math.log(2) ** 2)) or 1
+        self._hash_num = max(
+            1, int(round(self._bits_num / capacity * math.log(2))))
+        self._bits = bytearray((self._bits_num + 7) // 8)
+        self._fingerprints = None
+
+    def _positions(self, fp):
+        # 由64位指纹拆分出两个32位哈希，通过双重哈希得到k个位置
+        h1 = fp & 0xffffffff
+        h2 = fp >> 32
+        for i in range(self._hash_num):
+            yield (h1 + i * h2) % self._bits_num
+
+    def _contains(self, fp):
+        bits = self._bits
+        for pos in self._positions(fp):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def _add(self, fp, depth=None):
+        bits = self._bits
+        for pos in self._positions(fp):
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def _depth(self, fp):
+        return None
+
+
+SEEN_STORES = {
+    'set': SeenUrlStore,
+    'bloom': BloomSeenUrlStore,
+}
+
+
+def create_seen_store(mode=None):
+    """
+    根据模式创建去重存储
+    :param mode: set或bloom，默认读取配置
+    :return:
+    """
+    mode = mode or conf.SEEN_STORE_MODE
+    try:
+        store_class = SEEN_STORES[mode]
+    except KeyError:
+        logger.warning('Unknown seen store mode: {}, '
+                       'now use "set" instead'.format(mode))
+        store_class = SeenUrlStore
+    return store_class()
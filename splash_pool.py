@@ -0,0 +1,293 @@
+"""
+splash渲染执行器，使用独立的并发上限、带截止时间的队列与到splash的独立连接池
+"""
+import asyncio
+import json
+import time
+
+import aiohttp
+
+from aiohttp import ClientTimeout
+from loguru import logger
+
+import common as cm
+import config as conf
+
+from http_session import session_manager
+from proxy_utils import FetchResult
+from proxy_utils import aio_request
+from proxy_utils import read_body
+
+# 在一次/execute调用中依次渲染多个url
+BATCH_LUA_SOURCE = '''
+treat = require("treat")
+
+function main(splash, args)
+  splash.images_enabled = args.image == 1
+  local results = {}
+  for i, url in ipairs(args.urls) do
+    local ok, reason = splash:go(url)
+    if ok then
+      splash:wait(args.wait)
+      results[i] = {url = url, html = splash:html()}
+    else
+      results[i] = {url = url, error = tostring(reason)}
+    end
+  end
+  return treat.as_array(results)
+end
+'''
+
+
+class RenderTimeout(Exception):
+    """渲染任务在截止时间之前未能完成"""
+
+
+class RenderJob(object):
+    """一个待渲染的url"""
+    __slots__ = ('url', 'deadline', 'future', 'enqueued_at', 'budget',
+                 'on_chunk')
+
+    def __init__(self, url, deadline, future, budget=None, on_chunk=None):
+        self.url = url
+        self.deadline = deadline
+        self.future = future
+        self.enqueued_at = time.time()
+        self.budget = budget
+        self.on_chunk = on_chunk
+
+    @property
+    def expired(self):
+        return time.time() >= self.deadline
+
+
+class _LoopRenderers(object):
+    """一个事件循环中的渲染队列、工作协程与会话"""
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.workers = []
+        self.session = None
+
+
+class SplashPool(object):
+    """
+    splash渲染执行器，不占用爬虫的并发数，渲染较慢时任务在队列中等待，超过截止时间则放弃
+    batch_size大于1时，把队列中的多个url合并为一次/execute调用
+    每个事件循环使用各自的队列、工作协程与会话，渲染统计在进程内共享
+    """
+
+    def __init__(self, max_concurrency=None, batch_size=None,
+                 queue_timeout=None):
+        """
+        :param max_concurrency: 同时进行的渲染请求数
+        :param batch_size: 每次请求渲染的url数
+        :param queue_timeout: 任务从入队到完成的最长时间(单位：秒)
+        """
+        self._max_concurrency = max_concurrency or conf.SPLASH_CONCURRENCY
+        self._batch_size = batch_size or conf.SPLASH_BATCH_SIZE
+        self._queue_timeout = queue_timeout or conf.SPLASH_QUEUE_TIMEOUT
+        self._renderers = cm.LoopLocal(_LoopRenderers)
+        self.in_flight = 0
+        self.rendered = 0
+        self.failed = 0
+        self.expired = 0
+        # 渲染耗时与排队耗时的指数加权移动平均(单位：秒)
+        self.latency = 0.0
+        self.queue_wait = 0.0
+
+    @property
+    def queue_depth(self):
+        """当前事件循环中排队的任务数"""
+        local = self._renderers.peek()
+        return local.queue.qsize() if local is not None else 0
+
+    def stats(self):
+        """渲染统计"""
+        return {
+            'queue': self.queue_depth, 'in_flight': self.in_flight,
+            'rendered': self.rendered, 'failed': self.failed,
+            'expired': self.expired, 'latency': round(self.latency, 3),
+            'queue_wait': round(self.queue_wait, 3),
+        }
+
+    def _get_renderers(self):
+        local = self._renderers.get()
+        if local.session is None or local.session.closed:
+            local.session = aiohttp.ClientSession(
+                connector=session_manager.create_connector(
+                    limit=self._max_concurrency,
+                    limit_per_host=self._max_concurrency),
+                timeout=ClientTimeout(total=conf.CRAWL_TIMEOUT)
+            )
+        if len(local.workers) < self._max_concurrency:
+            local.workers.append(asyncio.ensure_future(self._work(local)))
+        return local
+
+    async def render(self, url, budget=None, on_chunk=None):
+        """
+        提交渲染任务并等待结果
+        :param url: 待渲染url
+        :param budget: 站点的字节数预算ByteBudget
+        :param on_chunk: 读取渲染结果时的回调，见proxy_utils.read_body
+        :return: FetchResult
+        """
+        local = self._get_renderers()
+        future = asyncio.get_event_loop().create_future()
+        local.queue.put_nowait(RenderJob(
+            url, time.time() + self._queue_timeout, future, budget, on_chunk))
+        return await future
+
+    def _observe(self, attr, value):
+        alpha = conf.SPLASH_EWMA_ALPHA
+        current = getattr(self, attr)
+        setattr(self, attr, alpha * value + (1 - alpha) * current
+                if current else value)
+
+    async def _next_batch(self, queue):
+        jobs = [await queue.get()]
+        while len(jobs) < self._batch_size:
+            try:
+                jobs.append(await asyncio.wait_for(
+                    queue.get(), conf.SPLASH_BATCH_WAIT))
+            except asyncio.TimeoutError:
+                break
+        alive = []
+        for job in jobs:
+            if job.future.done():
+                continue
+            if job.expired:
+                self.expired += 1
+                job.future.set_exception(RenderTimeout(
+                    'Render job expired in queue, url: {}'.format(job.url)))
+                continue
+            self._observe('queue_wait', time.time() - job.enqueued_at)
+            alive.append(job)
+        return alive
+
+    async def _work(self, local):
+        while True:
+            jobs = await self._next_batch(local.queue)
+            if not jobs:
+                continue
+            self.in_flight += len(jobs)
+            start = time.time()
+            try:
+                if len(jobs) == 1:
+                    await self._render_one(jobs[0], local.session)
+                else:
+                    await self._render_batch(jobs, local.session)
+                self._observe('latency', (time.time() - start) / len(jobs))
+            except asyncio.CancelledError:
+                for job in jobs:
+                    if not job.future.done():
+                        job.future.cancel()
+                raise
+            except Exception as err:
+                self.failed += len(jobs)
+                for job in jobs:
+                    if not job.future.done():
+                        job.future.set_exception(err)
+            finally:
+                self.in_flight -= len(jobs)
+
+    def _timeout(self, jobs):
+        remaining = min(job.deadline for job in jobs) - time.time()
+        return max(min(conf.SPLASH_TIMEOUT * len(jobs) + conf.SPLASH_TIMEOUT_MARGIN,
+                       remaining), 1)
+
+    async def _render_one(self, job, session):
+        params = {
+            'url': job.url,
+            'image': conf.ENABLE_IMAGE,
+            'timeout': conf.SPLASH_TIMEOUT
+        }
+        result = await aio_request(
+            'GET', conf.SPLASH_RENDER, params=params,
+            parse_redirect_url=False, timeout=self._timeout([job]),
+            budget=job.budget, on_chunk=job.on_chunk, session=session)
+        if result.status != 200:
+            # splash的错误响应为json，不能当作页面处理，由_work计入失败
+            raise RuntimeError('Splash render failed, status: {}, '
+                               'url: {}'.format(result.status, job.url))
+        self.rendered += 1
+        job.future.set_result(result)
+
+    async def _render_batch(self, jobs, session):
+        payload = {
+            'lua_source': BATCH_LUA_SOURCE,
+            'urls': [job.url for job in jobs],
+            'image': conf.ENABLE_IMAGE,
+            'wait': conf.SPLASH_WAIT,
+            'timeout': conf.SPLASH_TIMEOUT * len(jobs),
+        }
+        async with session.post(
+                conf.SPLASH_EXECUTE, json=payload,
+                timeout=ClientTimeout(total=self._timeout(jobs))) as resp:
+            content, truncated, _ = await read_body(
+                resp, conf.MAX_PAGE_BYTES * len(jobs))
+            status = resp.status
+        if status != 200 or truncated:
+            raise RuntimeError('Splash batch render failed, status: {}, '
+                               'truncated: {}'.format(status, truncated))
+        items = json.loads(content.decode('utf-8'))
+        if isinstance(items, dict):
+            items = [items[k] for k in sorted(items, key=int)]
+        for job, item in zip(jobs, items):
+            self._finish_batch_job(job, item)
+        for job in jobs[len(items):]:
+            self.failed += 1
+            job.future.set_exception(RuntimeError(
+                'No render result from splash, url: {}'.format(job.url)))
+
+    def _finish_batch_job(self, job, item):
+        html = item.get('html')
+        if html is None:
+            self.failed += 1
+            job.future.set_exception(RuntimeError(
+                'Splash render failed, url: {}, error: {}'.format(
+                    job.url, item.get('error'))))
+            return
+        content = html.encode('utf-8')
+        result = FetchResult(content, html, status=200)
+        if job.budget is not None:
+            job.budget.consume(len(content))
+        if job.on_chunk is not None and (job.on_chunk(content, False) or
+                                         job.on_chunk(b'', True)):
+            result.aborted = True
+        self.rendered += 1
+        job.future.set_result(result)
+
+    async def close(self):
+        """停止当前事件循环中的渲染并关闭连接"""
+        local = self._renderers.pop()
+        if local is None:
+            return
+        for worker in local.workers:
+            worker.cancel()
+        if local.workers:
+            await asyncio.gather(*local.workers, return_exceptions=True)
+        while not local.queue.empty():
+            job = local.queue.get_nowait()
+            if not job.future.done():
+                job.future.cancel()
+        if local.session is not None and not local.session.closed:
+            await local.session.close()
+        logger.info('Splash pool closed, stats: {}'.format(self.stats()))
+
+
+_pool = None
+
+
+def get_splash_pool():
+    """获取进程内共享的splash渲染执行器"""
+    global _pool
+    if _pool is None:
+        _pool = SplashPool()
+    return _pool
+
+
+async def close_splash_pool():
+    """关闭当前事件循环中的splash渲染执行器"""
+    if _pool is not None:
+        await _pool.close()
@@ -0,0 +1,65 @@
+"""
+Description: 页面内链接解析方式的性能对比
+    python link_extract_benchmark.py [页面文件路径] [页面url]
+"""
+import sys
+sys.path.append('./..')
+import timeit
+
+import common as cm
+
+from link_extractor import EXTRACTORS
+from link_extractor import filter_links
+
+REPEAT = 20
+
+
+def make_page(links_num=2000):
+    """构造一个包含大量链接的页面"""
+    items = []
+    for idx in range(links_num):
+        items.append(
+            '<li><a class="item" href="/news/{0}.html?id={0}&amp;p=1">'
+            '新闻标题{0}</a><span>来源：http://www.example.com/src/{0}'
+            '</span></li>'.format(idx))
+        if idx % 100 == 0:
+            items.append('<iframe src="/frame/{}.html"></iframe>'.format(idx))
+    return ''.join([
+        '<html><head><meta charset="utf-8"><title>test</title></head><body>',
+        '<ul>', ''.join(items), '</ul>',
+        '<script>var url = "http://static.example.com/app.js";</script>',
+        '</body></html>'
+    ])
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'rb') as fr:
+            page_content = fr.read()
+        page_text = cm.guess_and_decode(page_content)
+    else:
+        page_text = make_page()
+        page_content = page_text.encode('utf-8')
+    url = sys.argv[2] if len(sys.argv) > 2 else 'http://www.example.com/'
+    print('Page size: {} bytes'.format(len(page_content)))
+
+    results = {}
+    for name, collect in EXTRACTORS.items():
+        cost = timeit.timeit(
+            lambda: collect(url, page_content, page_text), number=REPEAT)
+        links = filter_links(url, collect(url, page_content, page_text), 2)
+        results[name] = links
+        print('{:<8} links: {:<6} cost: {:.2f}ms/page'.format(
+            name, len(links), cost / REPEAT * 1000))
+    names = list(results)
+    for name, other in [(names[0], names[1]), (names[1], names[0])]:
+        diff = results[name] - results[other]
+        print('Only found by {}: {}'.format(name, len(diff)))
+        for link in sorted(diff)[:10]:
+            print('    %s' % link)
+
+
+if __name__ == '__main__':
+    from loguru import logger
+    logger.remove()
+    main()
@@ -0,0 +1,98 @@
+"""
+User-Agent提供者，每个进程只加载一次UA数据
+"""
+import itertools
+import json
+import random
+
+from loguru import logger
+
+import config as conf
+import constansts as cons
+
+
+class UserAgentProvider(object):
+    """
+    从fake_useragent的数据文件中加载UA，按浏览器占比随机或轮换提供，
+    同时支持同一host固定使用一个UA，使cookie与反爬状态保持一致
+    """
+
+    def __init__(self, path=None, sticky_size=None):
+        """
+        :param path: fake_useragent数据文件路径
+        :param sticky_size: 记录host与UA对应关系的最大host数
+        """
+        self._browser_agents = {}
+        self._browser_weights = ()
+        self._agents = ()
+        self._load(path or conf.FAKE_UA_DATA_PATH)
+        self._rotation = itertools.cycle(self._agents)
+        self._sticky = {}
+        self._sticky_size = sticky_size or conf.UA_STICKY_HOSTS
+
+    def _load(self, path):
+        try:
+            with open(path, 'r') as fr:
+                data = json.load(fr)
+            browsers = data['browsers']
+            self._browser_agents = {
+                name: tuple(agents)
+                for name, agents in browsers.items() if agents
+            }
+            # 按照fake_useragent的浏览器占比表选取浏览器
+            self._browser_weights = tuple(
+                name for name in data.get('randomize', {}).values()
+                if name in self._browser_agents
+            ) or tuple(self._browser_agents)
+            self._agents = tuple(itertools.chain.from_iterable(
+                self._browser_agents.values()))
+        except Exception as err:
+            logger.warning('Load user-agent data from "{}" failed, now use '
+                           'the default list, error: {}'.format(path, err))
+        if not self._agents:
+            self._browser_agents = {'default': tuple(cons.USER_AGENT)}
+            self._browser_weights = ('default',)
+            self._agents = tuple(cons.USER_AGENT)
+
+    @property
+    def random(self):
+        """随机获取一个UA"""
+        browser = random.choice(self._browser_weights)
+        return random.choice(self._browser_agents[browser])
+
+    @property
+    def rotating(self):
+        """轮换获取下一个UA"""
+        return next(self._rotation)
+
+    def get(self, host=None):
+        """
+        获取一个UA，按照配置决定随机或轮换，指定host时同一host返回相同的UA
+        :param host: 请求的host
+        :return:
+        """
+        if host and conf.UA_STICKY_PER_HOST:
+            agent = self._sticky.get(host)
+            if agent is not None:
+                return agent
+        if conf.UA_MODE == 'rotate':
+            agent = self.rotating
+        else:
+            agent = self.random
+        if host and conf.UA_STICKY_PER_HOST:
+            if len(self._sticky) >= self._sticky_size:
+                # 淘汰最早记录的host
+                del self._sticky[next(iter(self._sticky))]
+            self._sticky[host] = agent
+        return agent
+
+
+_provider = None
+
+
+def get_user_agent_provider():
+    """获取进程内共享的UA提供者"""
+    global _provider
+    if _provider is None:
+        _provider = UserAgentProvider()
+    return _provider
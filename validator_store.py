@@ -0,0 +1,186 @@
+"""
+页面校验信息（ETag/Last-Modified）的存储，用于再次爬取时发送条件请求
+"""
+import json
+import os
+
+from loguru import logger
+
+import config as conf
+
+
+class ValidatorStore(object):
+    """
+    保存每个url的校验信息与页面内链接，只保存在内存中
+    数据格式为：
+        {
+            "http://www.example.com/a": {
+                "etag": "\\"5d8c72a5edda8\\"",
+                "last_modified": "Mon, 21 Oct 2019 07:28:00 GMT",
+                "links": ["http://www.example.com/b"],
+                "redirect": null
+            }
+        }
+    """
+
+    def __init__(self, records=None):
+        """
+        :param records: 已有的校验信息
+        """
+        self._records = {}
+        self.dirty = False
+        self.conditional = 0
+        self.not_modified = 0
+        if records:
+            self.load(records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def load(self, records):
+        """
+        载入校验信息，没有ETag与Last-Modified的记录将被忽略
+        :param records: url -> 校验信息
+        :return:
+        """
+        for url, record in records.items():
+            if record.get('etag') or record.get('last_modified'):
+                self._records[url] = {
+                    'etag': record.get('etag'),
+                    'last_modified': record.get('last_modified'),
+                    'links': list(record.get('links') or []),
+                    'redirect': record.get('redirect')
+                }
+
+    def get(self, url):
+        """获取url的校验信息，没有则返回None"""
+        return self._records.get(url)
+
+    def conditional_headers(self, url):
+        """
+        生成条件请求头
+        :param url: 页面url
+        :return: 请求头字典，没有校验信息时为空
+        """
+        record = self._records.get(url)
+        if record is None:
+            return {}
+        headers = {}
+        if record['etag']:
+            headers['If-None-Match'] = record['etag']
+        if record['last_modified']:
+            headers['If-Modified-Since'] = record['last_modified']
+        self.conditional += 1
+        return headers
+
+    def cached_record(self, url):
+        """
+        页面未修改时沿用上次保存的链接与跳转url
+        :param url: 页面url
+        :return: 校验信息，没有记录时返回None
+        """
+        self.not_modified += 1
+        return self._records.get(url)
+
+    @staticmethod
+    def make_record(headers, links=None, redirect=None):
+        """
+        按照响应头生成校验信息
+        :param headers: 响应头
+        :param links: 页面内链接
+        :param redirect: 页面中解析到的跳转url，页面未修改时同样需要继续爬取
+        :return: 校验信息，响应中没有ETag与Last-Modified时返回None
+        """
+        etag = headers.get('ETag') if headers else None
+        last_modified = headers.get('Last-Modified') if headers else None
+        if not etag and not last_modified:
+            return None
+        return {
+            'etag': etag,
+            'last_modified': last_modified,
+            'links': sorted(links) if links else [],
+            'redirect': redirect
+        }
+
+    def set(self, url, record):
+        """
+        保存校验信息，应在页面保存成功之后调用，避免未保存的页面在之后被判定为未修改
+        :param url: 页面url
+        :param record: make_record生成的校验信息
+        :return:
+        """
+        self._records[url] = record
+        self.dirty = True
+
+    def discard(self, url):
+        """删除url的校验信息"""
+        if self._records.pop(url, None) is not None:
+            self.dirty = True
+
+    def save(self):
+        """持久化，内存存储无需保存"""
+        pass
+
+    def stats(self):
+        """条件请求统计"""
+        return {'size': len(self), 'conditional': self.conditional,
+                'not_modified': self.not_modified}
+
+
+class FileValidatorStore(ValidatorStore):
+    """
+    将校验信息保存在输出目录下的json索引文件中
+    """
+
+    def __init__(self, output_dir):
+        """
+        :param output_dir: 站点的输出目录
+        """
+        super(FileValidatorStore, self).__init__()
+        self.path = os.path.join(output_dir, conf.VALIDATOR_INDEX_NAME)
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as fr:
+                    self.load(json.load(fr))
+            except (OSError, ValueError) as err:
+                logger.warning('Load validator index failed, now crawl all '
+                               'pages in full, path: {}, error: {}'.format(
+                                   self.path, err))
+
+    def save(self):
+        """有更新时写入临时文件再替换原索引，避免中断时损坏索引"""
+        if not self.dirty:
+            return
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as fw:
+                json.dump(self._records, fw, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as err:
+            logger.warning('Save validator index failed, path: {}, '
+                           'error: {}'.format(self.path, err))
+            return
+        self.dirty = False
+
+
+def create_validator_store(output_dir, task, pipelines=()):
+    """
+    创建校验信息存储：数据管道提供load_validators方法时从数据管道载入，
+    由数据管道随页面结果一同保存，否则使用输出目录下的索引文件
+    :param output_dir: 站点的输出目录
+    :param task: 爬取任务（站点url）
+    :param pipelines: 数据管道对象列表
+    :return:
+    """
+    loaders = [obj.load_validators for obj in pipelines
+               if callable(getattr(obj, 'load_validators', None))]
+    if not loaders:
+        return FileValidatorStore(output_dir)
+    store = ValidatorStore()
+    for load in loaders:
+        try:
+            store.load(load(task))
+        except Exception as err:
+            logger.warning('Load validators from pipeline failed, '
+                           'task: {}, error: {}'.format(task, err))
+    return store